@@ -2,6 +2,9 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve the async social login views through it so provider calls wait on the
+event loop instead of holding a worker thread. Under WSGI they still share
+one provider client (see core.oauth_clients) but hold a thread per call.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -97,12 +97,12 @@ DATABASES = {
 }
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.EstimatedCountPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -111,6 +111,29 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Paginated lists of tables with more rows than this report the planner's estimate, see core.pagination
+ESTIMATED_COUNT_THRESHOLD = config('ESTIMATED_COUNT_THRESHOLD', default=100000, cast=int)
+
+SIMPLE_JWT = {
+    # Refuses revoked refresh tokens, see core.revocation
+    'TOKEN_REFRESH_SERIALIZER': 'core.serializers.RevocableTokenRefreshSerializer',
+}
+
+# Cache
+# Use a shared backend (e.g. Redis) with more than one process. The default
+# in-memory cache is per process, so the homepage is then only invalidated in
+# the process that changed it, and cached auth versions are kept for a few
+# seconds only (see core.authentication)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='guide-app'),
+    }
+}
+
+# Seconds the homepage payload is served before it is rebuilt
+HOMEPAGE_CACHE_TIMEOUT = config('HOMEPAGE_CACHE_TIMEOUT', default=300, cast=int)
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -175,6 +198,13 @@ GOOGLE_OAUTH2_CLIENT_SECRET = config('GOOGLE_OAUTH2_CLIENT_SECRET', default='')
 FACEBOOK_APP_ID = config('FACEBOOK_APP_ID', default='')
 FACEBOOK_APP_SECRET = config('FACEBOOK_APP_SECRET', default='')
 
+# OAuth provider calls (core.oauth_clients)
+GOOGLE_USERINFO_URL = config('GOOGLE_USERINFO_URL', default='https://www.googleapis.com/oauth2/v1/userinfo')
+FACEBOOK_GRAPH_URL = config('FACEBOOK_GRAPH_URL', default='https://graph.facebook.com')
+OAUTH_HTTP_TIMEOUT = config('OAUTH_HTTP_TIMEOUT', default=5.0, cast=float)
+OAUTH_CONNECT_TIMEOUT = config('OAUTH_CONNECT_TIMEOUT', default=2.0, cast=float)
+OAUTH_MAX_CONNECTIONS = config('OAUTH_MAX_CONNECTIONS', default=50, cast=int)
+
 # Admin Interface Configuration
 X_FRAME_OPTIONS = 'SAMEORIGIN'
 SILKY_PYTHON_PROFILER = True
@@ -1,10 +1,14 @@
 from django.contrib import admin
+from django.db import models
+from django.db.models import Case, Value, When
+from django.db.models.functions import Concat
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.contrib.admin import AdminSite
 from django.template.response import TemplateResponse
 from .models import User, Guide, Tourist, Agency, Package, Booking, Rating
+from .pagination import EstimatedCountPaginator
 
 # Customize admin site headers
 admin.site.site_header = "Guide App Administration"
@@ -12,6 +16,45 @@ admin.site.site_title = "Guide App Admin"
 admin.site.index_title = "Welcome to Guide App Administration Panel"
 
 
+def full_name(path):
+    """First and last name of the user at ``path``, as a query expression"""
+    return Concat(f'{path}__first_name', Value(' '), f'{path}__last_name', output_field=models.CharField())
+
+
+def service_name(type_field):
+    """Name of the booked or rated package, guide or agency, as a query expression"""
+    return Case(
+        When(**{type_field: 'package', 'package__isnull': False}, then='package__name'),
+        When(**{type_field: 'guide', 'guide__isnull': False}, then=full_name('guide__user')),
+        When(**{type_field: 'agency', 'agency__isnull': False}, then='agency__company_name'),
+        default=Value('N/A'),
+        output_field=models.CharField(),
+    )
+
+
+class AnnotatedChangeListMixin:
+    """
+    Computes changelist columns in the changelist query: ``list_annotations``
+    maps attribute names to the expressions the display methods read, and
+    list_select_related names the joins the other columns and the rows'
+    __str__ (shown in the action checkbox) need, so a page costs the same
+    number of queries however many rows it shows.
+    """
+    list_annotations = {}
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(**self.list_annotations)
+
+
+class AgencyListFilter(admin.RelatedFieldListFilter):
+    """Agency filter whose choice labels, which may use the user's name, are read in one query"""
+    
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        agencies = Agency.objects.select_related('user').order_by(*ordering)
+        return [(agency.pk, str(agency)) for agency in agencies]
+
+
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = ['username', 'email', 'first_name', 'last_name', 'user_type', 'is_verified', 'is_approved', 'created_at']
@@ -38,20 +81,21 @@ class UserAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         })
     )
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related()
+    # __str__ reads the agency's company name; changelist rows render it in the action checkbox
+    list_select_related = ['agency_profile']
 
 @admin.register(Tourist)
-class TouristAdmin(admin.ModelAdmin):
+class TouristAdmin(AnnotatedChangeListMixin, admin.ModelAdmin):
     list_display = ['get_user_name', 'get_user_email', 'nationality', 'get_travel_interests', 'emergency_contact']
     list_filter = ['nationality', 'user__created_at']
     search_fields = ['user__username', 'user__email', 'user__first_name', 'user__last_name']
+    list_select_related = ['user']
+    list_annotations = {'user_full_name': full_name('user')}
     
     def get_user_name(self, obj):
-        return f"{obj.user.first_name} {obj.user.last_name}"
+        return obj.user_full_name
     get_user_name.short_description = 'Full Name'
-    get_user_name.admin_order_field = 'user__first_name'
+    get_user_name.admin_order_field = 'user_full_name'
     
     def get_user_email(self, obj):
         return obj.user.email
@@ -63,11 +107,13 @@ class TouristAdmin(admin.ModelAdmin):
     get_travel_interests.short_description = 'Travel Interests'
 
 @admin.register(Guide)
-class GuideAdmin(admin.ModelAdmin):
+class GuideAdmin(AnnotatedChangeListMixin, admin.ModelAdmin):
     list_display = ['get_user_name', 'get_user_email', 'get_specializations', 'experience_years', 'average_rating', 'total_trips', 'hourly_rate', 'daily_rate']
     list_filter = ['experience_years', 'average_rating', 'user__is_verified', 'user__created_at']
     search_fields = ['user__username', 'user__email', 'user__first_name', 'user__last_name', 'specializations']
     readonly_fields = ['average_rating', 'total_trips']
+    list_select_related = ['user']
+    list_annotations = {'user_full_name': full_name('user')}
     
     fieldsets = (
         ('Basic Information', {
@@ -90,9 +136,9 @@ class GuideAdmin(admin.ModelAdmin):
     )
     
     def get_user_name(self, obj):
-        return f"{obj.user.first_name} {obj.user.last_name}"
+        return obj.user_full_name
     get_user_name.short_description = 'Full Name'
-    get_user_name.admin_order_field = 'user__first_name'
+    get_user_name.admin_order_field = 'user_full_name'
     
     def get_user_email(self, obj):
         return obj.user.email
@@ -104,12 +150,14 @@ class GuideAdmin(admin.ModelAdmin):
     get_specializations.short_description = 'Specializations'
 
 @admin.register(Agency)
-class AgencyAdmin(admin.ModelAdmin):
+class AgencyAdmin(AnnotatedChangeListMixin, admin.ModelAdmin):
     list_display = ['company_name', 'get_user_email', 'get_user_name', 'average_rating', 'total_bookings', 'get_approval_status']
     list_filter = ['user__is_approved', 'user__is_verified', 'average_rating', 'user__created_at']
     search_fields = ['company_name', 'user__username', 'user__email', 'address']
     readonly_fields = ['average_rating', 'total_bookings']
     filter_horizontal = ['managed_guides']
+    list_select_related = ['user']
+    list_annotations = {'user_full_name': full_name('user')}
     
     fieldsets = (
         ('Company Information', {
@@ -131,9 +179,9 @@ class AgencyAdmin(admin.ModelAdmin):
     )
     
     def get_user_name(self, obj):
-        return f"{obj.user.first_name} {obj.user.last_name}"
+        return obj.user_full_name
     get_user_name.short_description = 'Contact Person'
-    get_user_name.admin_order_field = 'user__first_name'
+    get_user_name.admin_order_field = 'user_full_name'
     
     def get_user_email(self, obj):
         return obj.user.email
@@ -142,17 +190,18 @@ class AgencyAdmin(admin.ModelAdmin):
     
     def get_approval_status(self, obj):
         if obj.user.is_approved:
-            return format_html('<span style="color: green;">✓ Approved</span>')
+            return format_html('<span style="color: green;">{}</span>', '✓ Approved')
         else:
-            return format_html('<span style="color: red;">✗ Pending</span>')
+            return format_html('<span style="color: red;">{}</span>', '✗ Pending')
     get_approval_status.short_description = 'Status'
     get_approval_status.admin_order_field = 'user__is_approved'
 
 @admin.register(Package)
 class PackageAdmin(admin.ModelAdmin):
     list_display = ['name', 'agency', 'package_type', 'duration_days', 'price', 'max_people', 'average_rating', 'total_bookings', 'is_active']
-    list_filter = ['package_type', 'is_active', 'duration_days', 'agency', 'created_at']
+    list_filter = ['package_type', 'is_active', 'duration_days', ('agency', AgencyListFilter), 'created_at']
     search_fields = ['name', 'description', 'agency__company_name']
+    list_select_related = ['agency__user']
     readonly_fields = ['id', 'average_rating', 'total_bookings', 'created_at', 'updated_at']
     
     fieldsets = (
@@ -182,12 +231,17 @@ class PackageAdmin(admin.ModelAdmin):
     )
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(AnnotatedChangeListMixin, admin.ModelAdmin):
     list_display = ['id', 'get_tourist_name', 'booking_type', 'get_service_name', 'status', 'start_date', 'end_date', 'number_of_people', 'total_price']
     list_filter = ['booking_type', 'status', 'start_date', 'created_at']
     search_fields = ['tourist__user__username', 'tourist__user__email', 'package__name', 'guide__user__username', 'agency__company_name']
     readonly_fields = ['id', 'created_at', 'updated_at']
     date_hierarchy = 'start_date'
+    list_select_related = ['tourist__user']
+    # Counting these tables exactly is the slowest part of the changelist
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_annotations = {'tourist_name': full_name('tourist__user'), 'service_name': service_name('booking_type')}
     
     fieldsets = (
         ('Booking Information', {
@@ -209,26 +263,26 @@ class BookingAdmin(admin.ModelAdmin):
     )
     
     def get_tourist_name(self, obj):
-        return f"{obj.tourist.user.first_name} {obj.tourist.user.last_name}"
+        return obj.tourist_name
     get_tourist_name.short_description = 'Tourist'
-    get_tourist_name.admin_order_field = 'tourist__user__first_name'
+    get_tourist_name.admin_order_field = 'tourist_name'
     
     def get_service_name(self, obj):
-        if obj.booking_type == 'package' and obj.package:
-            return obj.package.name
-        elif obj.booking_type == 'guide' and obj.guide:
-            return f"{obj.guide.user.first_name} {obj.guide.user.last_name}"
-        elif obj.booking_type == 'agency' and obj.agency:
-            return obj.agency.company_name
-        return 'N/A'
+        return obj.service_name
     get_service_name.short_description = 'Service'
+    get_service_name.admin_order_field = 'service_name'
 
 @admin.register(Rating)
-class RatingAdmin(admin.ModelAdmin):
+class RatingAdmin(AnnotatedChangeListMixin, admin.ModelAdmin):
     list_display = ['get_tourist_name', 'rating_type', 'get_service_name', 'rating', 'get_rating_stars', 'created_at']
     list_filter = ['rating_type', 'rating', 'created_at']
     search_fields = ['tourist__user__username', 'tourist__user__email', 'review']
     readonly_fields = ['id', 'created_at']
+    list_select_related = ['tourist__user']
+    # Counting these tables exactly is the slowest part of the changelist
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_annotations = {'tourist_name': full_name('tourist__user'), 'service_name': service_name('rating_type')}
     
     fieldsets = (
         ('Rating Information', {
@@ -247,22 +301,17 @@ class RatingAdmin(admin.ModelAdmin):
     )
     
     def get_tourist_name(self, obj):
-        return f"{obj.tourist.user.first_name} {obj.tourist.user.last_name}"
+        return obj.tourist_name
     get_tourist_name.short_description = 'Tourist'
-    get_tourist_name.admin_order_field = 'tourist__user__first_name'
+    get_tourist_name.admin_order_field = 'tourist_name'
     
     def get_service_name(self, obj):
-        if obj.rating_type == 'package' and obj.package:
-            return obj.package.name
-        elif obj.rating_type == 'guide' and obj.guide:
-            return f"{obj.guide.user.first_name} {obj.guide.user.last_name}"
-        elif obj.rating_type == 'agency' and obj.agency:
-            return obj.agency.company_name
-        return 'N/A'
+        return obj.service_name
     get_service_name.short_description = 'Service'
+    get_service_name.admin_order_field = 'service_name'
     
     def get_rating_stars(self, obj):
         stars = '★' * obj.rating + '☆' * (5 - obj.rating)
-        return format_html(f'<span style="color: gold; font-size: 16px;">{stars}</span>')
+        return format_html('<span style="color: gold; font-size: 16px;">{}</span>', stars)
     get_rating_stars.short_description = 'Stars'
     get_rating_stars.admin_order_field = 'rating'
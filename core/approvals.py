@@ -0,0 +1,62 @@
+"""
+Bulk approval and rejection of agencies.
+
+A batch reads the current flags of the agencies' users in one query and
+writes the users that change in one UPDATE on core_user. The UPDATE bumps
+auth_version, as User.save() does when a claim field changes, so access
+tokens carrying the old flags are no longer trusted. The cached auth
+versions and the homepage are invalidated once per batch rather than per
+user, since update() sends no signals.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .authentication import forget_auth_versions_on_commit
+from .cache import HOMEPAGE_CACHE, invalidate_on_commit
+from .models import User
+
+MAX_BATCH_AGENCIES = 1000
+
+# decision -> (outcome of a changed agency, user fields it sets)
+AGENCY_DECISIONS = {
+    'approve': ('approved', {'is_approved': True, 'is_verified': True}),
+    'reject': ('rejected', {'is_active': False}),
+}
+
+
+class BatchTooLarge(Exception):
+    """More than MAX_BATCH_AGENCIES agencies were selected"""
+
+
+def decide_agencies(agencies, decision):
+    """
+    Apply an approval decision to the users of ``agencies``, a queryset.
+    Returns {agency id: outcome}, where agencies whose user already had the
+    decision applied are 'unchanged'.
+    """
+    outcome, changes = AGENCY_DECISIONS[decision]
+    fields = list(changes)
+    with transaction.atomic():
+        rows = list(
+            agencies.order_by('pk').values_list('pk', 'user_id', *(f'user__{field}' for field in fields))
+            [:MAX_BATCH_AGENCIES + 1]
+        )
+        if len(rows) > MAX_BATCH_AGENCIES:
+            raise BatchTooLarge(f'At most {MAX_BATCH_AGENCIES} agencies can be decided at once')
+
+        outcomes, user_ids = {}, []
+        for agency_id, user_id, *values in rows:
+            if list(values) == [changes[field] for field in fields]:
+                outcomes[agency_id] = 'unchanged'
+            else:
+                outcomes[agency_id] = outcome
+                user_ids.append(user_id)
+
+        if user_ids:
+            User.objects.filter(pk__in=user_ids).update(
+                **changes, auth_version=F('auth_version') + 1, updated_at=timezone.now(),
+            )
+            forget_auth_versions_on_commit(user_ids)
+            invalidate_on_commit(HOMEPAGE_CACHE)
+    return outcomes
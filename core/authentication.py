@@ -0,0 +1,139 @@
+"""
+JWT authentication served from token claims.
+
+Access tokens carry the user's claim fields (User.CLAIM_FIELDS) and the
+``auth_version`` they were issued at (``ver``). While that version is still
+current the request user is a ClaimsUser built from the claims, so
+authenticating costs no query; anything else a view reads from the user is
+loaded on first access. The current version of each user is cached per
+process for AUTH_VERSION_LOCAL_TTL seconds in front of the shared cache,
+which is refreshed when a claim field changes. A process-local cache backend
+cannot carry that refresh to other processes, so with one the cached
+versions also expire after AUTH_VERSION_LOCAL_TTL seconds; deployments with
+several processes should configure a shared backend (CACHE_BACKEND). Tokens
+whose version is outdated, and tokens issued without one, load the user from
+the database.
+"""
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import router, transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import ClaimsUser, User
+
+VERSION_CLAIM = 'ver'
+AUTH_VERSION_LOCAL_TTL = 5
+AUTH_VERSION_SHARED_TTL = 300
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+_local_versions = {}
+
+
+def _version_key(user_id):
+    return f'auth:version:{user_id}'
+
+
+def cache_is_process_local():
+    """Whether the default cache is private to this process, so other processes miss its changes"""
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], PROCESS_LOCAL_CACHES)
+
+
+def shared_version_ttl():
+    """Seconds a version stays in the shared cache; no longer than locally if it is not shared"""
+    return AUTH_VERSION_LOCAL_TTL if cache_is_process_local() else AUTH_VERSION_SHARED_TTL
+
+
+def add_claims(token, user):
+    """Copy the user's claim fields and auth version into a token"""
+    for name in User.CLAIM_FIELDS:
+        token[name] = getattr(user, name)
+    token[VERSION_CLAIM] = user.auth_version
+    return token
+
+
+def get_auth_version(user_id):
+    """The cached current auth version of a user, or None if it is not cached"""
+    local = _local_versions.get(str(user_id))
+    if local is not None and local[1] > time.monotonic():
+        return local[0]
+    version = cache.get(_version_key(user_id))
+    if version is not None:
+        _local_versions[str(user_id)] = (version, time.monotonic() + AUTH_VERSION_LOCAL_TTL)
+    return version
+
+
+def remember_auth_version(user_id, version, replace=True):
+    """
+    Cache a user's current auth version. Versions read from the database are
+    cached with ``replace=False`` so they never overwrite a newer published one.
+    """
+    if replace:
+        cache.set(_version_key(user_id), version, shared_version_ttl())
+    elif not cache.add(_version_key(user_id), version, shared_version_ttl()):
+        return
+    _local_versions[str(user_id)] = (version, time.monotonic() + AUTH_VERSION_LOCAL_TTL)
+
+
+def forget_auth_version(user_id):
+    cache.delete(_version_key(user_id))
+    _local_versions.pop(str(user_id), None)
+
+
+def forget_auth_versions_on_commit(user_ids):
+    """
+    Forget the cached versions of users whose version was bumped with
+    update(), now and again once the transaction commits, so a version read
+    from the database before the commit is not kept.
+    """
+    user_ids = [str(user_id) for user_id in user_ids]
+
+    def forget():
+        cache.delete_many([_version_key(user_id) for user_id in user_ids])
+        for user_id in user_ids:
+            _local_versions.pop(user_id, None)
+    forget()
+    transaction.on_commit(forget)
+
+
+def publish_auth_version_on_commit(user):
+    """
+    Stop trusting cached versions now, and cache the new one once it is
+    committed, so no request accepts outdated claims in between.
+    """
+    user_id, version = user.pk, user.auth_version
+    forget_auth_version(user_id)
+    transaction.on_commit(lambda: remember_auth_version(user_id, version))
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that trusts current token claims instead of loading the user"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        version = validated_token.get(VERSION_CLAIM)
+        if version is not None and version == get_auth_version(user_id):
+            return self.claims_user(validated_token, user_id, version)
+
+        user = super().get_user(validated_token)
+        remember_auth_version(user.pk, user.auth_version, replace=False)
+        return user
+
+    def claims_user(self, validated_token, user_id, version):
+        claims = {api_settings.USER_ID_FIELD: user_id, 'auth_version': version}
+        claims.update((name, validated_token[name]) for name in User.CLAIM_FIELDS)
+        # from_db expects the loaded values in field order; the rest are deferred
+        fields = [field for field in User._meta.concrete_fields if field.attname in claims]
+        return ClaimsUser.from_db(
+            router.db_for_read(User),
+            [field.attname for field in fields],
+            [field.to_python(claims[field.attname]) for field in fields],
+        )
@@ -0,0 +1,124 @@
+"""
+Guide availability calendar.
+
+Availability is derived from the guide's non-cancelled bookings that overlap
+the requested window. The overlap query is served by the partial
+(guide, start_date, end_date) index on Booking, so only bookings inside the
+window are read regardless of how many a guide has accumulated.
+
+New guide bookings reserve their dates under transaction-scoped advisory
+locks keyed by (guide, day). Requests whose ranges share a day queue on the
+same lock and see each other's committed booking, while bookings for other
+guides or disjoint dates never wait on each other.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import connection
+from rest_framework import serializers
+
+from .models import Booking
+
+DEFAULT_WINDOW_DAYS = 30
+MAX_WINDOW_DAYS = 366
+MAX_BATCH_GUIDES = 100
+# Longest booking accepted; bounds the advisory locks one reservation takes
+MAX_BOOKING_DAYS = MAX_WINDOW_DAYS
+
+
+def parse_window(params):
+    """Read start_date/end_date query params, defaulting to the next 30 days"""
+    try:
+        start = date.fromisoformat(params['start_date']) if params.get('start_date') else date.today()
+        end = (
+            date.fromisoformat(params['end_date']) if params.get('end_date')
+            else start + timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+        )
+    except ValueError:
+        raise serializers.ValidationError('Dates must use the YYYY-MM-DD format')
+    if end < start:
+        raise serializers.ValidationError('end_date must not be before start_date')
+    if (end - start).days + 1 > MAX_WINDOW_DAYS:
+        raise serializers.ValidationError(f'Availability window is limited to {MAX_WINDOW_DAYS} days')
+    return start, end
+
+
+def active_guide_bookings():
+    return Booking.objects.filter(guide__isnull=False).exclude(status='cancelled')
+
+
+def booked_ranges(guide_ids, start, end):
+    """Map each guide id to the (start, end) pairs of its bookings overlapping the window"""
+    rows = (
+        active_guide_bookings()
+        .filter(guide_id__in=guide_ids, start_date__lte=end, end_date__gte=start)
+        .order_by('guide_id', 'start_date')
+        .values_list('guide_id', 'start_date', 'end_date')
+    )
+    ranges = defaultdict(list)
+    for guide_id, booking_start, booking_end in rows:
+        ranges[guide_id].append((booking_start, booking_end))
+    return ranges
+
+
+def build_calendar(ranges, start, end):
+    """Merge booking ranges sorted by start date into booked and free periods of the window"""
+    booked = []
+    for booking_start, booking_end in ranges:
+        booking_start, booking_end = max(booking_start, start), min(booking_end, end)
+        if booked and booking_start <= booked[-1][1] + timedelta(days=1):
+            booked[-1][1] = max(booked[-1][1], booking_end)
+        else:
+            booked.append([booking_start, booking_end])
+
+    free = []
+    cursor = start
+    for booked_start, booked_end in booked:
+        if booked_start > cursor:
+            free.append([cursor, booked_start - timedelta(days=1)])
+        cursor = booked_end + timedelta(days=1)
+    if cursor <= end:
+        free.append([cursor, end])
+
+    booked_days = sum((period_end - period_start).days + 1 for period_start, period_end in booked)
+    return {
+        'start_date': start,
+        'end_date': end,
+        'is_available': not booked,
+        'booked_days': booked_days,
+        'free_days': (end - start).days + 1 - booked_days,
+        'booked': [{'start_date': s, 'end_date': e} for s, e in booked],
+        'free': [{'start_date': s, 'end_date': e} for s, e in free],
+    }
+
+
+def guide_availability(guide_ids, start, end):
+    """Availability calendars for many guides, answered with a single booking query"""
+    ranges = booked_ranges(guide_ids, start, end)
+    return {guide_id: build_calendar(ranges.get(guide_id, ()), start, end) for guide_id in guide_ids}
+
+
+def lock_guide_dates(guide_id, start, end):
+    """
+    Take a transaction-scoped advisory lock for every day of the range. Days are
+    locked in ascending order so concurrent reservations cannot deadlock.
+    """
+    if not connection.in_atomic_block:
+        raise RuntimeError('Guide dates can only be locked inside a transaction')
+    if (end - start).days + 1 > MAX_BOOKING_DAYS:
+        raise ValueError(f'Cannot lock more than {MAX_BOOKING_DAYS} days at once')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(%s::int, day) FROM generate_series(%s::int, %s::int) AS day',
+            [guide_id % 2 ** 31, start.toordinal(), end.toordinal()],
+        )
+
+
+def reserve_guide_dates(guide_id, start, end):
+    """Lock the guide's days and reject the range if another booking already holds any of them"""
+    lock_guide_dates(guide_id, start, end)
+    conflict = active_guide_bookings().filter(
+        guide_id=guide_id, start_date__lte=end, end_date__gte=start
+    ).exists()
+    if conflict:
+        raise serializers.ValidationError({'guide': 'Guide is already booked for the selected dates'})
@@ -0,0 +1,83 @@
+"""
+Shared payload caching with stampede protection.
+
+A cached payload is stored together with the generation it was built for and
+a freshness deadline. Invalidating a payload only bumps its generation, so the
+previous payload stays in the cache: when it is stale, one worker takes a
+short-lived rebuild lock and rebuilds it while the others keep serving the
+previous payload instead of all hitting the database at once.
+"""
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+HOMEPAGE_CACHE = 'homepage:content'
+
+COLD_START_WAIT = 2.0
+COLD_START_POLL = 0.05
+
+
+def _keys(name):
+    return f'{name}:payload', f'{name}:generation', f'{name}:rebuild-lock'
+
+
+def invalidate(name):
+    """Mark the cached payload stale; it is rebuilt on the next read"""
+    _, generation_key, _ = _keys(name)
+    cache.set(generation_key, uuid.uuid4().hex, None)
+
+
+def invalidate_on_commit(name):
+    """
+    Invalidate now and again once the current transaction commits, so a
+    rebuild that read the database before the commit is not kept as fresh.
+    """
+    invalidate(name)
+    transaction.on_commit(lambda: invalidate(name))
+
+
+def get_or_rebuild(name, build, fresh_for, stale_for=3600, lock_timeout=30):
+    """
+    Return the payload cached under ``name``, calling ``build()`` when it is
+    missing, older than ``fresh_for`` seconds or invalidated. Only the worker
+    holding the rebuild lock calls ``build()``; the others serve the stale
+    payload, or on a cold cache wait up to COLD_START_WAIT for it to appear.
+    """
+    payload_key, generation_key, lock_key = _keys(name)
+    cached = cache.get_many([payload_key, generation_key])
+    entry = cached.get(payload_key)
+    generation = cached.get(generation_key)
+    if entry is not None and entry['generation'] == generation and entry['fresh_until'] > time.time():
+        return entry['payload']
+
+    locked = cache.add(lock_key, True, lock_timeout)
+    if not locked:
+        if entry is not None:
+            return entry['payload']
+        entry = _wait_for_payload(payload_key)
+        if entry is not None:
+            return entry['payload']
+
+    try:
+        payload = build()
+        cache.set(payload_key, {
+            'payload': payload,
+            'generation': generation,
+            'fresh_until': time.time() + fresh_for,
+        }, fresh_for + stale_for)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return payload
+
+
+def _wait_for_payload(payload_key):
+    deadline = time.monotonic() + COLD_START_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(COLD_START_POLL)
+        entry = cache.get(payload_key)
+        if entry is not None:
+            return entry
+    return None
@@ -0,0 +1,139 @@
+"""
+Sparse fieldsets and opt-in expansion for API serializers.
+
+``?fields=id,name,agency.company_name`` keeps only the listed fields; dotted
+paths reach into nested serializers and a nested field listed without a path
+keeps all of its fields. ``?expand=managed_guides`` adds relations a
+serializer declares in ``expandable_fields`` but leaves out by default, and
+also takes dotted paths (``?expand=agency.managed_guides``). Both only apply
+to reads. An expansion may carry lookups restricting which related rows it
+lists, so it shows no more than the endpoint listing those rows would.
+``load_only_serialized`` turns the resulting serializer tree into
+``only()``, ``select_related`` and ``prefetch_related`` calls so the query
+loads nothing the response does not use.
+"""
+import sys
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_field_paths(value):
+    """'id,agency.name,agency.user' -> {'id': {}, 'agency': {'name': {}, 'user': {}}}"""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.split('.'):
+            if part.strip():
+                node = node.setdefault(part.strip(), {})
+    return tree
+
+
+def requested_field_spec(request):
+    """The (fields, expand) trees of a read request, or None when it asks for neither"""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    params = getattr(request, 'query_params', request.GET)
+    if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+        return None
+    fields = parse_field_paths(params[FIELDS_PARAM]) if params.get(FIELDS_PARAM) else None
+    return fields, parse_field_paths(params.get(EXPAND_PARAM, ''))
+
+
+class DynamicFieldsMixin:
+    """
+    Serializer mixin applying the request's ?fields= and ?expand=. Nested
+    serializers are narrowed by their parent, since only the top-level
+    serializer sees the request when it is created.
+    """
+    # name -> (serializer class or its name in the same module, init kwargs[, related row lookups])
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        spec = requested_field_spec(self.context.get('request'))
+        if spec is not None:
+            self.apply_field_spec(*spec)
+
+    def apply_field_spec(self, fields=None, expand=None):
+        expand = expand or {}
+        for name in expand:
+            if name in self.expandable_fields and name not in self.fields:
+                serializer_class, kwargs = self.expandable_fields[name][:2]
+                if isinstance(serializer_class, str):
+                    serializer_class = getattr(sys.modules[type(self).__module__], serializer_class)
+                self.fields[name] = serializer_class(**kwargs)
+        if fields:
+            for name in list(self.fields):
+                if name not in fields and name not in expand:
+                    self.fields.pop(name)
+        for name, field in self.fields.items():
+            child = getattr(field, 'child', field)
+            if isinstance(child, DynamicFieldsMixin):
+                child.apply_field_spec((fields or {}).get(name), expand.get(name))
+
+
+def load_only_serialized(queryset, serializer, required=()):
+    """
+    Restrict ``queryset`` to what ``serializer`` renders: to-one serializers
+    become select_related, to-many ones Prefetch objects planned the same way,
+    and only() keeps the rendered columns. only() is skipped when a field reads
+    something that is neither a model field nor an annotation.
+    """
+    only, select_related, prefetch, restrict = _plan(serializer, queryset.model, queryset.query.annotations, '')
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if restrict:
+        queryset = queryset.only(*only, *required)
+    return queryset
+
+
+def _plan(serializer, model, annotations, prefix):
+    only, select_related, prefetch, restrict = [], [], [], True
+    expandable = getattr(serializer, 'expandable_fields', {})
+    for key, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            restrict = False
+            continue
+        name = field.source_attrs[0]
+        path = prefix + name
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            restrict = restrict and not prefix and name in annotations
+            continue
+
+        child = getattr(field, 'child', field)
+        if model_field.many_to_many or model_field.one_to_many:
+            if isinstance(child, serializers.BaseSerializer):
+                # Reverse foreign keys need their link column to be matched to the parent rows
+                required = (model_field.field.name,) if model_field.one_to_many else ()
+                related = model_field.related_model._default_manager.all()
+                if len(expandable.get(key, ())) > 2:
+                    related = related.filter(**expandable[key][2])
+                prefetch.append(Prefetch(path, queryset=load_only_serialized(related, child, required)))
+            else:
+                prefetch.append(path)
+        elif isinstance(child, serializers.BaseSerializer):
+            select_related.append(path)
+            if model_field.concrete:
+                only.append(path)
+            nested = _plan(child, model_field.related_model, {}, path + '__')
+            only += nested[0]
+            select_related += nested[1]
+            prefetch += nested[2]
+            restrict = restrict and nested[3]
+        elif model_field.concrete:
+            only.append(path)
+        else:
+            restrict = False
+    return only, select_related, prefetch, restrict
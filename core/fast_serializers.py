@@ -0,0 +1,100 @@
+"""
+Values-based fast path for read-only list serializers.
+
+A ModelSerializer builds every row by instantiating model objects and walking
+its bound fields. For list responses the same JSON can be produced from
+``.values()`` rows: each serializer is compiled once into a flat plan of
+(output key, values() path, converter) entries, where converters are the
+serializer fields' own ``to_representation`` so the output stays identical.
+Nested serializers read the joined columns of the same row.
+"""
+from functools import lru_cache
+
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+
+class UnsupportedField(Exception):
+    """The serializer uses a field the values() fast path cannot reproduce"""
+
+
+class FileURL:
+    """FileField.to_representation for a stored file name instead of a FieldFile"""
+
+    def __init__(self, field, storage):
+        self.use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+        self.storage = storage
+
+    def __call__(self, name, request):
+        if not name:
+            return None
+        if not self.use_url:
+            return name
+        url = self.storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+class ValuesSerializer:
+    """
+    Compiled read-only form of a ModelSerializer class. ``values(queryset)``
+    selects exactly the columns the plan reads and ``to_representation(rows)``
+    builds the serializer's output for them.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.paths = []
+        self.plan = self.compile(serializer_class(), '')
+
+    def compile(self, serializer, prefix):
+        model = serializer.Meta.model
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or isinstance(field, (serializers.SerializerMethodField, serializers.ListSerializer)):
+                raise UnsupportedField(f'{serializer.__class__.__name__}.{name}')
+            path = prefix + '__'.join(field.source_attrs)
+            if isinstance(field, serializers.Serializer):
+                pk_path = f'{path}__{field.Meta.model._meta.pk.name}'
+                self.paths.append(pk_path)
+                plan.append((name, pk_path, None, self.compile(field, path + '__')))
+                continue
+            self.paths.append(path)
+            if isinstance(field, serializers.FileField):
+                if len(field.source_attrs) != 1:
+                    raise UnsupportedField(f'{serializer.__class__.__name__}.{name}')
+                storage = model._meta.get_field(field.source_attrs[0]).storage
+                plan.append((name, path, FileURL(field, storage), None))
+            else:
+                plan.append((name, path, field.to_representation, None))
+        return plan
+
+    def values(self, queryset):
+        return queryset.values(*dict.fromkeys(self.paths))
+
+    def to_representation(self, rows, request=None):
+        return [self.build(self.plan, row, request) for row in rows]
+
+    def build(self, plan, row, request):
+        data = {}
+        for name, path, convert, nested in plan:
+            value = row[path]
+            if value is None:
+                data[name] = None
+            elif nested is not None:
+                data[name] = self.build(nested, row, request)
+            elif isinstance(convert, FileURL):
+                data[name] = convert(value, request)
+            else:
+                data[name] = convert(value)
+        return data
+
+
+@lru_cache(maxsize=None)
+def get_values_serializer(serializer_class):
+    """The compiled ValuesSerializer for a serializer class, or None if it cannot be compiled"""
+    try:
+        return ValuesSerializer(serializer_class)
+    except UnsupportedField:
+        return None
@@ -0,0 +1,101 @@
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import F
+from django_filters import rest_framework as filters
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Agency, Booking, Guide
+
+
+class JSONListFilter(filters.CharFilter):
+    """
+    Filter a JSON list column by comma separated values. ``match='all'`` keeps
+    rows whose list contains every value (jsonb ``@>``), ``match='any'`` rows
+    that contain at least one (jsonb ``?|``). Both are served by a GIN index.
+    """
+
+    def __init__(self, *args, match='all', **kwargs):
+        self.match = match
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        values = [item.strip() for item in value.split(',') if item.strip()] if value else []
+        if not values:
+            return qs
+        lookup = 'has_any_keys' if self.match == 'any' else 'contains'
+        return qs.filter(**{f'{self.field_name}__{lookup}': values})
+
+
+class GuideFilterSet(filters.FilterSet):
+    """?languages=French,Spanish matches guides speaking both, ?languages_any= either"""
+    languages = JSONListFilter(field_name='languages')
+    languages_any = JSONListFilter(field_name='languages', match='any')
+    specializations = JSONListFilter(field_name='specializations')
+    specializations_any = JSONListFilter(field_name='specializations', match='any')
+
+    class Meta:
+        model = Guide
+        fields = ['user__is_verified']
+
+
+class AgencyFilterSet(filters.FilterSet):
+    """Same all/any list matching for operating regions and certifications"""
+    operating_regions = JSONListFilter(field_name='operating_regions')
+    operating_regions_any = JSONListFilter(field_name='operating_regions', match='any')
+    certifications = JSONListFilter(field_name='certifications')
+    certifications_any = JSONListFilter(field_name='certifications', match='any')
+
+    class Meta:
+        model = Agency
+        fields = ['agency_type', 'city', 'country']
+
+
+class ChoiceInFilter(filters.BaseInFilter, filters.ChoiceFilter):
+    """Comma separated choices, each validated against the field's choices"""
+
+
+class BookingFilterSet(filters.FilterSet):
+    """
+    ?status=pending,confirmed keeps bookings in any of the statuses;
+    ?date_from=/?date_to= keep bookings overlapping that window.
+    """
+    status = ChoiceInFilter(field_name='status', choices=Booking.BOOKING_STATUS)
+    date_from = filters.DateFilter(field_name='end_date', lookup_expr='gte')
+    date_to = filters.DateFilter(field_name='start_date', lookup_expr='lte')
+
+    class Meta:
+        model = Booking
+        fields = ['booking_type']
+
+
+class PackageSearchFilter(BaseFilterBackend):
+    """
+    Relevance-ranked full-text search over Package.search_vector (?q=, or the
+    older ?search=). Matches are annotated with ``rank`` and a highlighted
+    ``headline`` snippet of the description and, unless the client asked for
+    an explicit ?ordering=, returned best match first.
+    """
+    search_params = ('q', 'search')
+    config = 'english'
+
+    def get_search_terms(self, request):
+        for param in self.search_params:
+            terms = request.query_params.get(param, '').strip()
+            if terms:
+                return terms
+        return ''
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        query = SearchQuery(terms, search_type='websearch', config=self.config)
+        queryset = queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query),
+            headline=SearchHeadline(
+                'description', query, config=self.config,
+                start_sel='<mark>', stop_sel='</mark>', max_words=35, min_words=15,
+            ),
+        )
+        if not request.query_params.get('ordering'):
+            queryset = queryset.order_by('-rank', '-average_rating', 'id')
+        return queryset
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.media_jobs import process_media_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued media jobs, such as fetching social login profile images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--concurrency', type=int, default=4, help='Downloads running at once')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            claimed = process_media_jobs(batch_size=options['batch_size'], concurrency=options['concurrency'])
+            processed += claimed
+            if claimed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} media jobs'))
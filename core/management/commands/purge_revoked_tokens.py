@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.revocation import purge_expired_revocations
+
+
+class Command(BaseCommand):
+    help = 'Delete revoked refresh tokens that have since expired'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_revocations()
+        self.stdout.write(self.style.SUCCESS(f'Purged {deleted} expired revoked tokens'))
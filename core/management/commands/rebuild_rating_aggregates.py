@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating sums, counts and averages for packages, guides and agencies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_rating_aggregates(batch_size=options['batch_size'])
+        for target, count in rebuilt.items():
+            self.stdout.write(f'{target}: {count} rated rows')
+        self.stdout.write(self.style.SUCCESS('Successfully rebuilt rating aggregates'))
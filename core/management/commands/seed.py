@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.seeding import DEFAULT_COUNTS, Seeder, clear_seed_data, has_seed_data
+
+
+class Command(BaseCommand):
+    help = 'Generate a reproducible synthetic dataset of users, guides, agencies, packages, bookings and ratings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1, help='Multiplier for the default row counts')
+        for name, count in DEFAULT_COUNTS.items():
+            parser.add_argument(f'--{name}', type=int, help=f'Number of {name} (default {count} x scale)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--password', default='password123', help='Password of every seeded user')
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded data first')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(f'Deleted {clear_seed_data()} seeded rows')
+        elif has_seed_data():
+            raise CommandError('Seeded data already exists; pass --clear to replace it')
+        seeder = Seeder(
+            scale=options['scale'],
+            counts={name: options[name] for name in DEFAULT_COUNTS},
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            password=options['password'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        counts = seeder.run()
+        summary = ', '.join(f'{count} {name}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Seeded {summary}'))
@@ -0,0 +1,137 @@
+"""
+Background media jobs.
+
+Social logins queue the provider's profile picture as a MediaJob instead of
+downloading it while the user waits. The process_media_jobs command claims
+due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so several workers can run
+side by side, then downloads and resizes a batch on a bounded thread pool;
+only the worker's own thread touches the database. Failed jobs are retried
+with exponential backoff until MAX_ATTEMPTS.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+import requests
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import MediaJob, User
+
+# Square sizes, in pixels; the first is stored as the profile image and the
+# others next to it as <name>_<size>.jpg
+AVATAR_SIZES = (256, 96, 48)
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+DOWNLOAD_TIMEOUT = (2, 10)
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 30
+# How long a claimed job may run before another worker takes it over
+JOB_LEASE = timedelta(minutes=5)
+
+download_session = requests.Session()
+
+
+def enqueue_profile_image(user, image_url):
+    return MediaJob.objects.create(kind='profile_image', user=user, source_url=image_url)
+
+
+def avatar_name(user, size):
+    """Storage name of one of the user's avatar sizes"""
+    name = f'profiles/profile_{user.pk}.jpg'
+    return name if size == AVATAR_SIZES[0] else name.replace('.jpg', f'_{size}.jpg')
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=RETRY_BASE_DELAY * 2 ** (attempts - 1))
+
+
+def claim_jobs(limit):
+    """Lease up to ``limit`` due jobs to this worker"""
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            MediaJob.objects.select_for_update(skip_locked=True)
+            .filter(status__in=['pending', 'running'], run_after__lte=now)
+            .select_related('user')
+            .order_by('run_after')[:limit]
+        )
+        for job in jobs:
+            job.status, job.attempts, job.run_after = 'running', job.attempts + 1, now + JOB_LEASE
+            job.updated_at = now
+        MediaJob.objects.bulk_update(jobs, ['status', 'attempts', 'run_after', 'updated_at'])
+    return jobs
+
+
+def download_image(url):
+    with download_session.get(url, timeout=DOWNLOAD_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        data = BytesIO()
+        for chunk in response.iter_content(64 * 1024):
+            data.write(chunk)
+            if data.tell() > MAX_IMAGE_BYTES:
+                raise ValueError(f'Image is larger than {MAX_IMAGE_BYTES} bytes')
+    return data.getvalue()
+
+
+def resize_avatar(data):
+    """JPEG bytes of the image cropped to a square at each of AVATAR_SIZES"""
+    with Image.open(BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        avatars = {}
+        for size in AVATAR_SIZES:
+            output = BytesIO()
+            ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS).save(output, 'JPEG', quality=85)
+            avatars[size] = output.getvalue()
+    return avatars
+
+
+def fetch_avatars(job):
+    """Download and resize a job's image, off the database; returns the avatars or the error"""
+    try:
+        return resize_avatar(download_image(job.source_url)), None
+    except Exception as e:
+        return None, e
+
+
+def save_avatars(job, avatars):
+    with transaction.atomic():
+        # Re-read under a row lock: the user may have uploaded a picture during the download
+        user = User.objects.select_for_update().only('profile_image').get(pk=job.user_id)
+        if user.profile_image and user.profile_image.name != avatar_name(user, AVATAR_SIZES[0]):
+            return  # The user uploaded a picture of their own in the meantime
+        storage = user.profile_image.storage
+        names = {}
+        for size, data in avatars.items():
+            storage.delete(avatar_name(user, size))
+            names[size] = storage.save(avatar_name(user, size), ContentFile(data))
+        user.profile_image = names[AVATAR_SIZES[0]]
+        user.save(update_fields=['profile_image'])
+
+
+def finish_job(job, avatars, error):
+    if error is None:
+        try:
+            save_avatars(job, avatars)
+        except Exception as e:
+            error = e
+    if error is None:
+        job.status, job.last_error = 'done', ''
+    elif job.attempts < MAX_ATTEMPTS:
+        job.status, job.last_error = 'pending', str(error)
+        job.run_after = timezone.now() + retry_delay(job.attempts)
+    else:
+        job.status, job.last_error = 'failed', str(error)
+    job.save(update_fields=['status', 'last_error', 'run_after', 'updated_at'])
+
+
+def process_media_jobs(batch_size=20, concurrency=4):
+    """Run one batch of due jobs. Returns how many were claimed"""
+    jobs = claim_jobs(batch_size)
+    if not jobs:
+        return 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='media-jobs') as executor:
+        for job, (avatars, error) in zip(jobs, executor.map(fetch_avatars, jobs)):
+            finish_job(job, avatars, error)
+    return len(jobs)
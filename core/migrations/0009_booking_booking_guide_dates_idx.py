@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-17 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_agency_rating_count_agency_rating_sum_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status', 'cancelled'), _negated=True), fields=['guide', 'start_date', 'end_date'], name='booking_guide_dates_idx'),
+        ),
+    ]
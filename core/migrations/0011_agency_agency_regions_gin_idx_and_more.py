@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-17 07:54
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_package_search_vector_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agency',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['operating_regions'], name='agency_regions_gin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agency',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['certifications'], name='agency_certifications_gin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guide',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['languages'], name='guide_languages_gin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guide',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['specializations'], name='guide_specializations_gin_idx'),
+        ),
+    ]
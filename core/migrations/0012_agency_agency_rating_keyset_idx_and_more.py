@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-17 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_agency_agency_regions_gin_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agency',
+            index=models.Index(fields=['-average_rating', '-id'], name='agency_rating_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guide',
+            index=models.Index(fields=['-average_rating', '-id'], name='guide_rating_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['-average_rating', '-id'], name='package_rating_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-17 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Link every existing booking to its package's agency, the agencies managing
+# its guide and its directly booked agency
+BACKFILL_SQL = """
+INSERT INTO core_agencybooking (agency_id, booking_id, created_at)
+SELECT owner.agency_id, booking.id, booking.created_at
+FROM core_booking AS booking
+CROSS JOIN LATERAL (
+    SELECT booking.agency_id WHERE booking.agency_id IS NOT NULL
+    UNION SELECT package.agency_id FROM core_package AS package WHERE package.id = booking.package_id
+    UNION SELECT managed.agency_id FROM core_agency_managed_guides AS managed WHERE managed.guide_id = booking.guide_id
+) AS owner (agency_id)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_agency_agency_rating_keyset_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgencyBooking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('agency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_links', to='core.agency')),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agency_links', to='core.booking')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['agency', '-created_at', '-booking'], name='agency_booking_recent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('agency', 'booking'), name='unique_agency_booking')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-17 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_agencybooking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agency',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='guide',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
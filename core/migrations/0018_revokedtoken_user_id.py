@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Replace RevokedToken.user with a plain user_id column. The foreign key's
+    constraint and index are dropped, keeping the column and its values.
+    """
+
+    dependencies = [
+        ('core', '0017_mediajob'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AlterField(
+                    model_name='revokedtoken',
+                    name='user',
+                    field=models.ForeignKey(
+                        blank=True, null=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                        related_name='revoked_tokens', to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            state_operations=[
+                migrations.RemoveField(model_name='revokedtoken', name='user'),
+                migrations.AddField(
+                    model_name='revokedtoken',
+                    name='user_id',
+                    field=models.UUIDField(blank=True, null=True),
+                ),
+            ],
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models.functions import Cast
 from django.core.validators import RegexValidator
 from django.utils import timezone
 from django.core.exceptions import ValidationError
@@ -30,6 +33,21 @@ class User(AbstractUser):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped whenever a field copied into JWT claims changes, see core.authentication
+    auth_version = models.PositiveIntegerField(default=0, editable=False)
+
+    # Fields carried in access tokens, besides the id
+    CLAIM_FIELDS = ('username', 'email', 'user_type', 'is_verified', 'is_approved', 'is_active')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_claims = instance.claim_values()
+        return instance
+
+    def claim_values(self):
+        """Loaded values of the claim fields, without loading deferred ones"""
+        return {name: self.__dict__.get(name, models.DEFERRED) for name in self.CLAIM_FIELDS}
 
     @property
     def is_tourist(self):
@@ -57,7 +75,21 @@ class User(AbstractUser):
             self.is_approved = True
             self.is_verified = True
         
+        # Outdate the claims of tokens issued before a claim field changed
+        update_fields = kwargs.get('update_fields')
+        claims = self.claim_values()
+        self._auth_version_changed = (
+            not self._state.adding
+            and claims != getattr(self, '_loaded_claims', None)
+            and (update_fields is None or not set(self.CLAIM_FIELDS).isdisjoint(update_fields))
+        )
+        if self._auth_version_changed:
+            self.auth_version += 1
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'auth_version'}
+        
         super().save(*args, **kwargs)
+        self._loaded_claims = claims
     
     def get_profile(self):
         """Get the related profile based on user type"""
@@ -109,6 +141,23 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS =['username']
 
+
+class ClaimsUser(User):
+    """
+    User rebuilt from access token claims without a query. Fields the claims
+    do not carry are deferred, and touching any of them loads all of them
+    with a single query instead of one per field.
+    """
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred.issuperset(fields):
+            fields = deferred
+        super().refresh_from_db(using, fields, from_queryset)
+
 class Tourist(models.Model):
     TRAVEL_INTERESTS_CHOICES = [
         ('adventure', 'Adventure'),
@@ -180,7 +229,19 @@ class Guide(models.Model):
     portfolio_images = models.JSONField(default=list, blank=True)
     bio = models.TextField(blank=True, null=True)
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
     total_trips = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            # Containment (@>, ?|) filtering on the JSON lists
+            GinIndex(fields=['languages'], name='guide_languages_gin_idx'),
+            GinIndex(fields=['specializations'], name='guide_specializations_gin_idx'),
+            # Keyset pagination over the default rating ordering
+            models.Index(fields=['-average_rating', '-id'], name='guide_rating_keyset_idx'),
+        ]
     
     def __str__(self):
         return f"Guide: {self.user.username}"
@@ -213,6 +274,8 @@ class Agency(models.Model):
     commission_rate = models.DecimalField(max_digits=5, decimal_places=2, default=15.00)
     managed_guides = models.ManyToManyField(Guide, blank=True, related_name='agencies')
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
     total_bookings = models.IntegerField(default=0)
     total_revenue = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
     description = models.TextField(blank=True, null=True)
@@ -220,6 +283,7 @@ class Agency(models.Model):
     employee_count = models.IntegerField(blank=True, null=True)
     certifications = models.JSONField(default=list, blank=True, help_text="List of certifications")
     operating_regions = models.JSONField(default=list, blank=True, help_text="Regions where agency operates")
+    updated_at = models.DateTimeField(auto_now=True)
     
     def clean(self):
         if self.user and not self.user.is_agency:
@@ -263,6 +327,13 @@ class Agency(models.Model):
         verbose_name = 'Agency Profile'
         verbose_name_plural = 'Agency Profiles'
         ordering = ['-user__created_at']
+        indexes = [
+            # Containment (@>, ?|) filtering on the JSON lists
+            GinIndex(fields=['operating_regions'], name='agency_regions_gin_idx'),
+            GinIndex(fields=['certifications'], name='agency_certifications_gin_idx'),
+            # Keyset pagination over the default rating ordering
+            models.Index(fields=['-average_rating', '-id'], name='agency_rating_keyset_idx'),
+        ]
 
 
 class Package(models.Model):
@@ -293,9 +364,28 @@ class Package(models.Model):
     images = models.JSONField(default=list, blank=True)  # Package images
     is_active = models.BooleanField(default=True)
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
     total_bookings = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Weighted full-text document, kept up to date by the database on every write
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name', weight='A', config='english')
+            + SearchVector(Cast('destinations', models.TextField()), weight='B', config='english')
+            + SearchVector('description', weight='C', config='english')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+    
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='package_search_vector_idx'),
+            # Keyset pagination over the default rating ordering
+            models.Index(fields=['-average_rating', '-id'], name='package_rating_keyset_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.agency.company_name}"
@@ -333,9 +423,95 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Range-overlap lookups for guide availability and double-booking checks
+            models.Index(
+                fields=['guide', 'start_date', 'end_date'],
+                name='booking_guide_dates_idx',
+                condition=~models.Q(status='cancelled'),
+            ),
+        ]
+    
     def __str__(self):
         return f"Booking {self.id} - {self.tourist.user.username}"
 
+class AgencyBooking(models.Model):
+    """
+    Denormalized link from a booking to every agency that owns it: the
+    package's agency, the agencies managing the booked guide, or the booked
+    agency. Maintained by signals in core.ownership so an agency's bookings are
+    one range scan of (agency, created_at) instead of an OR across joins.
+    """
+    agency = models.ForeignKey(Agency, on_delete=models.CASCADE, related_name='booking_links')
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='agency_links')
+    # Copy of Booking.created_at so the index can serve the listing order
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['agency', 'booking'], name='unique_agency_booking'),
+        ]
+        indexes = [
+            models.Index(fields=['agency', '-created_at', '-booking'], name='agency_booking_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.agency} - Booking {self.booking_id}"
+
+class RevokedToken(models.Model):
+    """
+    Durable record of a revoked refresh token, kept until the token would have
+    expired anyway. Lookups go through core.revocation, which caches them.
+    ``user_id`` is the token's claim, kept without a foreign key so tokens of
+    deleted users can still be revoked.
+    """
+    jti = models.CharField(max_length=255, primary_key=True)
+    user_id = models.UUIDField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Revoked token {self.jti}"
+
+class MediaJob(models.Model):
+    """
+    Background media work, run by the process_media_jobs command (see
+    core.media_jobs). Pending jobs become due at ``run_after``; a claimed job
+    is leased until then, so the work of a worker that died is picked up again.
+    """
+    JOB_KIND = (
+        ('profile_image', 'Profile Image'),
+    )
+    
+    JOB_STATUS = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    
+    kind = models.CharField(max_length=20, choices=JOB_KIND)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='media_jobs')
+    source_url = models.URLField(max_length=2000)
+    status = models.CharField(max_length=20, choices=JOB_STATUS, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['run_after'], name='media_job_due_idx',
+                condition=models.Q(status__in=['pending', 'running']),
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} job for {self.user} ({self.status})"
+
 class Rating(models.Model):
     RATING_TYPE = (
         ('package', 'Package'),
@@ -359,6 +535,16 @@ class Rating(models.Model):
     class Meta:
         unique_together = ['tourist', 'package', 'guide', 'agency']  # One rating per tourist per item
     
+    TARGET_FIELDS = ('package', 'guide', 'agency')
+    
+    def get_targets(self):
+        """Return (target field, target id) pairs this rating counts towards"""
+        return [
+            (field, getattr(self, f'{field}_id'))
+            for field in self.TARGET_FIELDS
+            if getattr(self, f'{field}_id') is not None
+        ]
+    
     def __str__(self):
         return f"Rating {self.rating}/5 by {self.tourist.user.username}"
 
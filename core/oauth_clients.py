@@ -0,0 +1,127 @@
+"""
+Async calls to the OAuth providers used by the social login endpoints.
+
+Provider calls run on one event loop in a background thread, which owns a
+single httpx client, so connections to a provider are reused across logins
+whether the views are served over ASGI or over WSGI, where every request
+runs on a new event loop of its own. Its timeouts bound how long a slow
+provider can hold a request, and its connection limit bounds how many
+provider calls are in flight: once the limit is reached, further calls wait
+up to the pool timeout for a free connection and then fail. Provider URLs
+come from the settings so tests can point them at a local server.
+"""
+import asyncio
+import threading
+
+import httpx
+from django.conf import settings
+
+_loop = None
+_loop_lock = threading.Lock()
+_client = None
+
+
+class ProviderError(Exception):
+    """A provider call failed; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def provider_loop():
+    """The event loop provider calls run on, started on first use"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='oauth-clients', daemon=True).start()
+    return _loop
+
+
+def run_on_provider_loop(coroutine):
+    """Run ``coroutine`` on the provider loop and await its result from the caller's loop"""
+    return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, provider_loop()))
+
+
+def call_provider(coroutine):
+    """Run ``coroutine`` on the provider loop from synchronous code and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coroutine, provider_loop()).result()
+
+
+def get_client():
+    """The shared client; only to be used on the provider loop"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.OAUTH_HTTP_TIMEOUT, connect=settings.OAUTH_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.OAUTH_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OAUTH_MAX_CONNECTIONS,
+            ),
+        )
+    return _client
+
+
+async def _close_client():
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+async def close_client():
+    """Close the shared client and its connections; the next call opens a new one"""
+    await run_on_provider_loop(_close_client())
+
+
+async def _get(url, **kwargs):
+    return await get_client().get(url, **kwargs)
+
+
+async def fetch_profile(provider, url, invalid_message, **kwargs):
+    """GET a provider's JSON profile, raising ProviderError when it cannot be read"""
+    try:
+        response = await run_on_provider_loop(_get(url, **kwargs))
+    except httpx.TimeoutException:
+        raise ProviderError(f'{provider} did not respond in time', 504)
+    except httpx.HTTPError:
+        raise ProviderError(f'Failed to connect to {provider}', 502)
+    if response.status_code != 200:
+        raise ProviderError(invalid_message)
+    try:
+        return response.json()
+    except ValueError:
+        raise ProviderError(f'Unexpected response from {provider}', 502)
+
+
+async def fetch_google_profile(access_token):
+    return await fetch_profile(
+        'Google', settings.GOOGLE_USERINFO_URL, 'Invalid Google token',
+        params={'alt': 'json'}, headers={'Authorization': f'Bearer {access_token}'},
+    )
+
+
+async def fetch_facebook_profile(access_token):
+    return await fetch_profile(
+        'Facebook', f'{settings.FACEBOOK_GRAPH_URL}/me', 'Invalid Facebook token',
+        params={'fields': 'id,email,first_name,last_name,name,picture.type(large)', 'access_token': access_token},
+    )
+
+
+async def fetch_facebook_token(access_token):
+    """Debug a Facebook access token and read its profile at the same time; returns both"""
+    graph_url = settings.FACEBOOK_GRAPH_URL
+    app_id = getattr(settings, 'FACEBOOK_APP_ID', '')
+    app_secret = getattr(settings, 'FACEBOOK_APP_SECRET', '')
+    return await asyncio.gather(
+        fetch_profile(
+            'Facebook', f'{graph_url}/debug_token', 'Invalid Facebook token',
+            params={'input_token': access_token, 'access_token': f'{app_id}|{app_secret}'},
+        ),
+        fetch_profile(
+            'Facebook', f'{graph_url}/me', 'Invalid Facebook token',
+            params={'access_token': access_token, 'fields': 'id,email,first_name,last_name,name,picture.type(large)'},
+        ),
+    )
@@ -1,10 +1,92 @@
+import base64
+import hashlib
 import json
+import re
+import threading
+import time
 import requests
 from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from google.auth import exceptions as google_exceptions, jwt as google_jwt
 from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token
 from rest_framework import serializers
 
+from .media_jobs import enqueue_profile_image
+from .oauth_clients import ProviderError, call_provider, fetch_facebook_token
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_CERTS_TIMEOUT = 5
+# Used when the certificate response carries no max-age
+GOOGLE_CERTS_DEFAULT_MAX_AGE = 300
+# A token signed with an unknown key refetches the certificates at most this often
+GOOGLE_CERTS_MIN_REFRESH = 60
+
+# Usernames are at most 150 characters; keep room for a _<counter> suffix
+USERNAME_BASE_LENGTH = 140
+# Username picks tried when concurrent sign-ups take the chosen one
+USERNAME_ATTEMPTS = 5
+
+# Seconds a successful Facebook token validation is reused
+FACEBOOK_TOKEN_CACHE_TTL = 30
+
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class GoogleCertCache:
+    """
+    Google's ID token signing certificates, shared by the whole process and
+    fetched again once their Cache-Control max-age has passed, or early when
+    a token names a key they do not contain (Google rotated its keys).
+    """
+    
+    def __init__(self, request, url=GOOGLE_CERTS_URL):
+        self.request = request
+        self.url = url
+        self.certs = None
+        self.expires_at = 0
+        self.fetched_at = 0
+        self.lock = threading.Lock()
+    
+    def get(self, key_id=None):
+        certs, now = self.certs, time.monotonic()
+        stale = certs is None or now >= self.expires_at
+        rotated = (
+            key_id is not None and certs is not None and key_id not in certs
+            and now - self.fetched_at >= GOOGLE_CERTS_MIN_REFRESH
+        )
+        if stale or rotated:
+            with self.lock:
+                # Another thread may have refreshed them while this one waited
+                if self.certs is certs:
+                    self.refresh()
+        return self.certs
+    
+    def refresh(self):
+        response = self.request(self.url, method='GET', timeout=GOOGLE_CERTS_TIMEOUT)
+        if response.status != 200:
+            raise google_exceptions.TransportError(f'Could not fetch certificates at {self.url}')
+        cache_control = {key.lower(): value for key, value in response.headers.items()}.get('cache-control', '')
+        match = MAX_AGE_RE.search(cache_control)
+        max_age = int(match.group(1)) if match else GOOGLE_CERTS_DEFAULT_MAX_AGE
+        self.fetched_at = time.monotonic()
+        self.expires_at = self.fetched_at + max_age
+        self.certs = json.loads(response.data.decode('utf-8'))
+
+
+# Keep-alive session reused for every certificate fetch
+google_certs = GoogleCertCache(google_requests.Request(session=requests.Session()))
+
+
+def _token_key_id(token):
+    """The unverified ``kid`` of a JWT's header, or None"""
+    header = token.split('.', 1)[0] if isinstance(token, str) else ''
+    try:
+        return json.loads(base64.urlsafe_b64decode(header + '=' * (-len(header) % 4))).get('kid')
+    except (ValueError, AttributeError):
+        return None
+
 
 class GoogleOAuth:
     """Google OAuth utility class"""
@@ -15,11 +97,13 @@ class GoogleOAuth:
         Verify Google ID token and return user data
         """
         try:
-            # Specify the CLIENT_ID of the app that accesses the backend
-            idinfo = id_token.verify_oauth2_token(
-                token, 
-                google_requests.Request(), 
-                getattr(settings, 'GOOGLE_OAUTH2_CLIENT_ID', None)
+            # Specify the CLIENT_ID of the app that accesses the backend; the
+            # signature is checked locally against the cached certificates
+            idinfo = google_jwt.decode(
+                token,
+                certs=google_certs.get(_token_key_id(token)),
+                audience=getattr(settings, 'GOOGLE_OAUTH2_CLIENT_ID', None),
+                clock_skew_in_seconds=0,
             )
 
             # ID token is valid. Get the user's Google Account ID from the decoded token.
@@ -47,57 +131,43 @@ class GoogleOAuth:
 class FacebookOAuth:
     """Facebook OAuth utility class"""
     
+    @staticmethod
+    def cache_key(access_token):
+        return f'oauth:facebook:{hashlib.sha256(access_token.encode()).hexdigest()}'
+    
     @staticmethod
     def verify_facebook_token(access_token):
         """
-        Verify Facebook access token and return user data
+        Verify Facebook access token and return user data. The token is
+        debugged and the profile read concurrently through the shared provider
+        client (see core.oauth_clients); successful results are cached
+        briefly, so a retried login skips the Graph API calls.
         """
+        cache_key = FacebookOAuth.cache_key(access_token)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            # Verify the token with Facebook
-            app_id = getattr(settings, 'FACEBOOK_APP_ID', '')
-            app_secret = getattr(settings, 'FACEBOOK_APP_SECRET', '')
-            
-            # Debug token to verify it's valid
-            debug_url = f'https://graph.facebook.com/debug_token'
-            debug_params = {
-                'input_token': access_token,
-                'access_token': f'{app_id}|{app_secret}'
-            }
-            
-            debug_response = requests.get(debug_url, params=debug_params)
-            debug_data = debug_response.json()
-            
-            if 'error' in debug_data or not debug_data.get('data', {}).get('is_valid'):
-                raise ValueError('Invalid Facebook token')
-            
-            # Get user data
-            user_url = 'https://graph.facebook.com/me'
-            user_params = {
-                'access_token': access_token,
-                'fields': 'id,email,first_name,last_name,name,picture.type(large)'
-            }
-            
-            user_response = requests.get(user_url, params=user_params)
-            user_data = user_response.json()
-            
-            if 'error' in user_data:
-                raise ValueError(f'Facebook API error: {user_data["error"]["message"]}')
-            
-            return {
-                'facebook_id': user_data.get('id'),
-                'email': user_data.get('email'),
-                'first_name': user_data.get('first_name', ''),
-                'last_name': user_data.get('last_name', ''),
-                'name': user_data.get('name', ''),
-                'profile_image': user_data.get('picture', {}).get('data', {}).get('url', ''),
-            }
-            
-        except requests.RequestException as e:
-            raise serializers.ValidationError(f'Failed to connect to Facebook: {str(e)}')
-        except ValueError as e:
-            raise serializers.ValidationError(f'Invalid Facebook token: {str(e)}')
-        except Exception as e:
-            raise serializers.ValidationError(f'Failed to verify Facebook token: {str(e)}')
+            debug_data, user_data = call_provider(fetch_facebook_token(access_token))
+        except ProviderError as e:
+            raise serializers.ValidationError(e.message)
+        
+        if 'error' in debug_data or not debug_data.get('data', {}).get('is_valid'):
+            raise serializers.ValidationError('Invalid Facebook token')
+        if 'error' in user_data:
+            raise serializers.ValidationError(f'Facebook API error: {user_data["error"]["message"]}')
+        
+        facebook_user_data = {
+            'facebook_id': user_data.get('id'),
+            'email': user_data.get('email'),
+            'first_name': user_data.get('first_name', ''),
+            'last_name': user_data.get('last_name', ''),
+            'name': user_data.get('name', ''),
+            'profile_image': user_data.get('picture', {}).get('data', {}).get('url', ''),
+        }
+        cache.set(cache_key, facebook_user_data, FACEBOOK_TOKEN_CACHE_TTL)
+        return facebook_user_data
 
 
 class SocialAuthUtils:
@@ -105,22 +175,31 @@ class SocialAuthUtils:
     
     @staticmethod
     def generate_unique_username(base_name, email):
-        """Generate a unique username from name and email"""
+        """
+        Generate a unique username from name and email: the base itself, or
+        base_<n> with the lowest free n. Taken names are read in one query
+        that the username's prefix index narrows to the base.
+        """
         from .models import User
         
-        # Clean the base name
+        # Clean the base name, leaving room for a counter
         base_username = base_name.lower().replace(' ', '_')
         if not base_username:
             base_username = email.split('@')[0].lower()
+        base_username = base_username[:USERNAME_BASE_LENGTH]
         
         # Ensure username is unique
-        username = base_username
+        taken = User.objects.filter(
+            username__startswith=base_username,
+            username__regex=rf'^{re.escape(base_username)}(_[0-9]+)?$',
+        ).values_list('username', flat=True)
+        counters = {int(name[len(base_username) + 1:]) if name != base_username else 0 for name in taken}
+        if 0 not in counters:
+            return base_username
         counter = 1
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}_{counter}"
+        while counter in counters:
             counter += 1
-        
-        return username
+        return f"{base_username}_{counter}"
     
     @staticmethod
     def get_or_create_user_from_social_data(user_data, provider):
@@ -182,35 +261,23 @@ class SocialAuthUtils:
         elif provider == 'facebook':
             user_fields['facebook_id'] = provider_id
         
-        user = User.objects.create_user(**user_fields)
+        # A concurrent sign-up may take the same username first; pick again. If
+        # it was the same person signing up, log in to the account it created
+        for attempt in range(USERNAME_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    user = User.objects.create_user(**user_fields)
+                break
+            except IntegrityError:
+                if User.objects.filter(Q(email=email) | Q(**{f'{provider}_id': provider_id})).exists():
+                    return SocialAuthUtils.get_or_create_user_from_social_data(user_data, provider)
+                if attempt == USERNAME_ATTEMPTS - 1:
+                    raise
+                user_fields['username'] = SocialAuthUtils.generate_unique_username(user_data.get('name', ''), email)
         
-        # Download and save profile image if available
+        # Fetch the profile image in the background, see core.media_jobs
         profile_image_url = user_data.get('profile_image')
         if profile_image_url:
-            try:
-                SocialAuthUtils.save_profile_image_from_url(user, profile_image_url)
-            except:
-                pass  # If profile image saving fails, it's not critical
+            enqueue_profile_image(user, profile_image_url)
         
         return user, True  # User created
-    
-    @staticmethod
-    def save_profile_image_from_url(user, image_url):
-        """Save profile image from URL"""
-        import tempfile
-        from django.core.files import File
-        from django.core.files.temp import NamedTemporaryFile
-        import requests
-        
-        try:
-            response = requests.get(image_url, timeout=10)
-            if response.status_code == 200:
-                img_temp = NamedTemporaryFile(delete=True)
-                img_temp.write(response.content)
-                img_temp.flush()
-                
-                # Save to user profile
-                filename = f"profile_{user.id}.jpg"
-                user.profile_image.save(filename, File(img_temp), save=True)
-        except Exception:
-            pass  # Silently fail if image can't be saved
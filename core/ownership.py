@@ -0,0 +1,95 @@
+"""
+Agency ownership of bookings.
+
+A booking belongs to the agency of its package, to every agency managing its
+guide and to the agency it books directly. Those owners are written to
+AgencyBooking when the booking is saved and kept up to date as guides join
+or leave agencies, so an agency's bookings are read from a single
+(agency, created_at) index instead of an OR across joins and a subquery.
+"""
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Agency, AgencyBooking, Booking, Package
+
+OWNER_FIELDS = ('package', 'guide', 'agency')
+ManagedGuide = Agency.managed_guides.through
+
+REBUILD_SQL = '''
+INSERT INTO {links} (agency_id, booking_id, created_at)
+SELECT owner.agency_id, booking.id, booking.created_at
+FROM {bookings} AS booking
+CROSS JOIN LATERAL (
+    SELECT booking.agency_id WHERE booking.agency_id IS NOT NULL
+    UNION SELECT package.agency_id FROM {packages} AS package WHERE package.id = booking.package_id
+    UNION SELECT managed.agency_id FROM {managed} AS managed WHERE managed.guide_id = booking.guide_id
+) AS owner (agency_id)
+'''
+
+
+def booking_owner_ids(booking):
+    """Ids of the agencies owning a booking"""
+    owners = set()
+    if booking.agency_id:
+        owners.add(booking.agency_id)
+    if booking.package_id:
+        if Booking.package.is_cached(booking):
+            owners.add(booking.package.agency_id)
+        else:
+            owners.add(Package.objects.values_list('agency_id', flat=True).get(pk=booking.package_id))
+    if booking.guide_id:
+        owners.update(ManagedGuide.objects.filter(guide_id=booking.guide_id).values_list('agency_id', flat=True))
+    return owners
+
+
+def sync_booking_owners(booking, created=False):
+    """Write the booking's owner links, dropping stale ones for an existing booking"""
+    owners = booking_owner_ids(booking)
+    if not created:
+        AgencyBooking.objects.filter(booking=booking).exclude(agency_id__in=owners).delete()
+    AgencyBooking.objects.bulk_create(
+        [AgencyBooking(agency_id=agency_id, booking=booking, created_at=booking.created_at) for agency_id in owners],
+        ignore_conflicts=True,
+    )
+
+
+def link_guide_bookings(agency_ids, guide_ids, batch_size=1000):
+    """Link every booking of the guides to agencies that started managing them"""
+    bookings = Booking.objects.filter(guide_id__in=guide_ids).values_list('pk', 'created_at')
+    links = (
+        AgencyBooking(agency_id=agency_id, booking_id=booking_id, created_at=created_at)
+        for booking_id, created_at in bookings.iterator(chunk_size=batch_size)
+        for agency_id in agency_ids
+    )
+    while batch := list(islice(links, batch_size)):
+        AgencyBooking.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def unlink_guide_bookings(agency_ids=None, guide_ids=None):
+    """
+    Drop the guide booking links of agencies that stopped managing the guides,
+    keeping those the agency also owns through the package or a direct booking.
+    ``None`` matches every agency or guide.
+    """
+    links = AgencyBooking.objects.filter(booking__guide__isnull=False)
+    if agency_ids is not None:
+        links = links.filter(agency_id__in=agency_ids)
+    if guide_ids is not None:
+        links = links.filter(booking__guide_id__in=guide_ids)
+    links.exclude(booking__agency_id=F('agency_id')).exclude(booking__package__agency_id=F('agency_id')).delete()
+
+
+def rebuild_agency_booking_links():
+    """Recreate every link from the bookings table. Returns the number of links"""
+    with transaction.atomic():
+        AgencyBooking.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(REBUILD_SQL.format(
+                links=AgencyBooking._meta.db_table,
+                bookings=Booking._meta.db_table,
+                packages=Package._meta.db_table,
+                managed=ManagedGuide._meta.db_table,
+            ))
+            return cursor.rowcount
@@ -0,0 +1,158 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from functools import cached_property
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet, ValidationError as DjangoValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+COUNT_SQL = '''
+SELECT CASE WHEN reltuples < %s THEN (SELECT COUNT(*) FROM ({query}) AS counted) END, reltuples
+FROM pg_class WHERE oid = %s::regclass
+'''
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that counts large tables from the Postgres planner's estimate.
+
+    Tables with fewer than ESTIMATED_COUNT_THRESHOLD rows (by pg_class
+    reltuples, or never analyzed) are counted exactly in the same query that
+    reads the estimate. Above it, an unfiltered queryset reports reltuples and
+    a filtered one the row estimate of its EXPLAIN plan, falling back to an
+    exact count when that estimate is below the threshold. Counts above the
+    threshold are therefore approximate.
+    """
+
+    @property
+    def threshold(self):
+        return settings.ESTIMATED_COUNT_THRESHOLD
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        queryset = self.object_list.order_by()
+        try:
+            query, params = queryset.query.get_compiler(queryset.db).as_sql()
+        except EmptyResultSet:
+            return 0
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                COUNT_SQL.format(query=query),
+                [self.threshold, *params, queryset.model._meta.db_table],
+            )
+            exact, table_rows = cursor.fetchone()
+        if exact is not None:
+            return exact
+        if self.is_whole_table(queryset.query):
+            return int(table_rows)
+        estimate = json.loads(queryset.explain(format='json'))[0]['Plan']['Plan Rows']
+        return estimate if estimate >= self.threshold else queryset.count()
+
+    @staticmethod
+    def is_whole_table(query):
+        return not (query.where or query.distinct or query.group_by or query.combinator or query.is_sliced)
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """
+    PageNumberPagination whose count is estimated on large tables. Views that
+    already counted the filtered queryset (see ConditionalGetMixin) set
+    ``known_count`` so the page is not counted twice.
+    """
+    known_count = None
+
+    def django_paginator_class(self, object_list, per_page):
+        paginator = EstimatedCountPaginator(object_list, per_page)
+        if self.known_count is not None:
+            paginator.count = self.known_count
+        return paginator
+
+
+class RatingKeysetPagination(EstimatedCountPagination):
+    """
+    Page-number pagination, plus a keyset mode for infinite scroll.
+
+    Passing ``?cursor=`` (empty for the first page) switches to keyset
+    pagination on the unique (average_rating, id) key, walked in descending
+    order: each page is read with the equivalent of ``WHERE (average_rating,
+    id) < (...)`` from the matching composite index and no COUNT(*) is run, so deep pages cost
+    the same as the first one. Keyset mode only supports the default rating
+    ordering.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    key_fields = ('average_rating', 'id')
+    supported_orderings = ((), ('-average_rating',))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        if tuple(queryset.query.order_by) not in self.supported_orderings:
+            raise ValidationError({'cursor': 'Cursor pagination only supports the default rating ordering'})
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*(f'-{field}' for field in self.key_fields))
+        position = self.decode_cursor(request.query_params[self.cursor_query_param], queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.before(position))
+        rows = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            # Rows are model instances, or dicts when the view pages a values() queryset
+            values = last if isinstance(last, dict) else {field: getattr(last, field) for field in self.key_fields}
+            self.next_position = [str(values[field]) for field in self.key_fields]
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.next_position)
+        )
+
+    def before(self, position):
+        """Rows after ``position`` in descending key order, i.e. (average_rating, id) < position"""
+        rating, pk = position
+        # The redundant bound lets the index scan start at the cursor
+        return Q(average_rating__lte=rating) & (Q(average_rating__lt=rating) | Q(average_rating=rating, id__lt=pk))
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, encoded, model):
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if not isinstance(position, list) or len(position) != len(self.key_fields):
+                raise ValueError
+            fields = [model._meta.get_field(name) for name in self.key_fields]
+            return tuple(field.to_python(value) for field, value in zip(fields, position))
+        except (binascii.Error, ValueError, TypeError, DjangoValidationError):
+            raise NotFound('Invalid cursor')
@@ -0,0 +1,98 @@
+"""
+Rating aggregates for packages, guides and agencies.
+
+Each rated model keeps a running ``rating_sum`` and ``rating_count``; the
+``average_rating`` column is recomputed from them inside the same UPDATE, so
+creating, changing or deleting a rating never rescans the ratings table.
+These UPDATEs bypass auto_now, so they set ``updated_at`` themselves to keep
+conditional GET validators current. They also bypass the save signals, so a
+full rebuild invalidates the homepage itself.
+"""
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from .cache import HOMEPAGE_CACHE, invalidate_on_commit
+from .models import Rating
+
+AVERAGE_FIELD = DecimalField(max_digits=3, decimal_places=2)
+
+
+def get_target_model(target_field):
+    return Rating._meta.get_field(target_field).related_model
+
+
+def average_expression(total, count):
+    """SQL expression for total / count rounded into average_rating, 0 when unrated"""
+    average = Cast(total, DecimalField(max_digits=12, decimal_places=4)) / NullIf(count, 0)
+    return Coalesce(Cast(average, AVERAGE_FIELD), Value(Decimal('0.00')), output_field=AVERAGE_FIELD)
+
+
+def apply_rating_deltas(deltas):
+    """
+    Apply {(target field, target id): (score delta, count delta)} to the targets
+    with one atomic UPDATE per target row.
+    """
+    with transaction.atomic(savepoint=False):
+        for (target_field, target_id), (score_delta, count_delta) in deltas.items():
+            if not score_delta and not count_delta:
+                continue
+            total = F('rating_sum') + score_delta
+            count = F('rating_count') + count_delta
+            get_target_model(target_field).objects.filter(pk=target_id).update(
+                rating_sum=total,
+                rating_count=count,
+                average_rating=average_expression(total, count),
+                updated_at=timezone.now(),
+            )
+
+
+def rating_deltas(old=None, new=None):
+    """Deltas that move aggregates from an old rating state to a new one"""
+    deltas = defaultdict(lambda: (0, 0))
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        score, targets = state
+        for target in targets:
+            score_delta, count_delta = deltas[target]
+            deltas[target] = (score_delta + sign * score, count_delta + sign)
+    return dict(deltas)
+
+
+def rebuild_rating_aggregates(batch_size=1000):
+    """
+    Recompute every aggregate from the ratings table, with one grouped query
+    per target type. Returns the number of rated rows per target type.
+    """
+    rebuilt = {}
+    with transaction.atomic():
+        for target_field in Rating.TARGET_FIELDS:
+            model = get_target_model(target_field)
+            totals = (
+                Rating.objects.filter(**{f'{target_field}__isnull': False})
+                .values_list(target_field)
+                .annotate(total=Sum('rating'), count=Count('id'))
+                .order_by()
+            )
+            now = timezone.now()
+            model.objects.update(rating_sum=0, rating_count=0, average_rating=Decimal('0.00'), updated_at=now)
+            rows = []
+            for target_id, total, count in totals:
+                rows.append(model(
+                    pk=target_id,
+                    rating_sum=total,
+                    rating_count=count,
+                    average_rating=(Decimal(total) / count).quantize(Decimal('0.01'), ROUND_HALF_UP),
+                    updated_at=now,
+                ))
+            model.objects.bulk_update(
+                rows, ['rating_sum', 'rating_count', 'average_rating', 'updated_at'], batch_size=batch_size
+            )
+            rebuilt[target_field] = len(rows)
+        invalidate_on_commit(HOMEPAGE_CACHE)
+    return rebuilt
@@ -0,0 +1,83 @@
+"""
+Refresh token revocation.
+
+Revoked tokens are stored by ``jti`` in RevokedToken until they would have
+expired anyway, and mirrored in the cache for the same time. A check looks
+at the tokens this process already knows are revoked, then at the shared
+cache, and only on a cache miss at the database (a primary key lookup), so
+it costs the same however many tokens have been revoked. Revocation is
+permanent, so positive answers are kept in process memory; negative ones
+are cached briefly with cache.add so they never overwrite a revocation,
+and not at all when the cache is process-local, since a revocation in
+another process would not replace them.
+"""
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import cache_is_process_local
+from .models import RevokedToken
+
+# Seconds a "not revoked" answer is cached
+NEGATIVE_TTL = 60
+# Prune expired entries from the in-process set once it grows past this
+LOCAL_PRUNE_SIZE = 10000
+
+_local_revoked = {}
+
+
+def _key(jti):
+    return f'auth:revoked:{jti}'
+
+
+def _remaining(exp):
+    return max(int(exp - time.time()), 1)
+
+
+def _remember_revoked(jti, exp):
+    if len(_local_revoked) >= LOCAL_PRUNE_SIZE:
+        now = time.time()
+        for expired in [key for key, expires in _local_revoked.items() if expires <= now]:
+            _local_revoked.pop(expired, None)
+    _local_revoked[jti] = exp
+
+
+def revoke_token(token):
+    """Revoke a refresh token until it expires"""
+    jti, exp = token[api_settings.JTI_CLAIM], token['exp']
+    RevokedToken.objects.bulk_create([RevokedToken(
+        jti=jti,
+        user_id=token.get(api_settings.USER_ID_CLAIM),
+        expires_at=datetime.fromtimestamp(exp, tz=timezone.utc),
+    )], ignore_conflicts=True)
+
+    def publish():
+        _remember_revoked(jti, exp)
+        cache.set(_key(jti), True, _remaining(exp))
+    transaction.on_commit(publish)
+
+
+def is_token_revoked(token):
+    """Whether a refresh token has been revoked"""
+    jti, exp = token[api_settings.JTI_CLAIM], token['exp']
+    if jti in _local_revoked:
+        return True
+    revoked = cache.get(_key(jti))
+    if revoked is None:
+        revoked = RevokedToken.objects.filter(pk=jti).exists()
+        if revoked:
+            cache.set(_key(jti), True, _remaining(exp))
+        elif not cache_is_process_local():
+            cache.add(_key(jti), False, min(NEGATIVE_TTL, _remaining(exp)))
+    if revoked:
+        _remember_revoked(jti, exp)
+    return revoked
+
+
+def purge_expired_revocations():
+    """Delete records of tokens that have expired. Returns how many were deleted"""
+    deleted, _ = RevokedToken.objects.filter(expires_at__lte=datetime.now(tz=timezone.utc)).delete()
+    return deleted
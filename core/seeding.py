@@ -0,0 +1,254 @@
+"""
+Synthetic dataset generator behind ``manage.py seed``.
+
+Rows are built from a seeded random.Random and written with bulk_create in
+batches, so the same options always produce the same data and memory stays
+bounded by the batch size plus the id lists of the parent tables. Timestamps
+are spread over the SPREAD_DAYS before today instead of all being "now", guide
+bookings never overlap, and the derived tables (agency booking links and
+rating aggregates) are rebuilt at the end as they would be after the
+equivalent API traffic. Seeded usernames start with SEED_PREFIX.
+"""
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from .models import Agency, Booking, Guide, Package, Rating, Tourist, User
+from .ownership import rebuild_agency_booking_links
+from .ratings import rebuild_rating_aggregates
+
+SEED_PREFIX = 'seed_'
+SPREAD_DAYS = 730
+
+# Rows per entity at scale 1
+DEFAULT_COUNTS = {
+    'tourists': 1000,
+    'guides': 200,
+    'agencies': 50,
+    'packages': 500,
+    'bookings': 5000,
+    'ratings': 3000,
+}
+
+FIRST_NAMES = ['Aarav', 'Sita', 'John', 'Maya', 'Liam', 'Priya', 'Noah', 'Anita', 'Emma', 'Ravi', 'Olivia', 'Karma']
+LAST_NAMES = ['Sharma', 'Gurung', 'Smith', 'Thapa', 'Brown', 'Rai', 'Müller', 'Tamang', 'Garcia', 'Shrestha']
+CITIES = ['Kathmandu', 'Pokhara', 'Chitwan', 'Lumbini', 'Bhaktapur', 'Namche', 'Lukla', 'Bandipur', 'Ilam']
+LANGUAGES = ['English', 'Nepali', 'Hindi', 'German', 'French', 'Spanish', 'Chinese', 'Japanese']
+SPECIALIZATIONS = ['trekking', 'mountaineering', 'wildlife', 'cultural', 'rafting', 'photography', 'pilgrimage']
+INTERESTS = ['hiking', 'culture', 'food', 'wildlife', 'photography', 'adventure', 'spirituality']
+REVIEWS = ['Amazing trip', 'Well organised', 'Good value', 'Could be better', 'Unforgettable views', None]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created_at/updated_at set on the rows instead of now()"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Seeder:
+    """Generates one dataset; ``counts`` override DEFAULT_COUNTS times ``scale``"""
+
+    def __init__(self, scale=1, counts=None, seed=0, batch_size=5000, password='password123', log=None):
+        self.counts = {name: int(count * scale) for name, count in DEFAULT_COUNTS.items()}
+        self.counts.update({name: count for name, count in (counts or {}).items() if count is not None})
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        # One hash for every seeded user; a fixed salt keeps the rows reproducible
+        self.password = make_password(password, salt=f'{SEED_PREFIX}{seed}')
+        self.log = log or (lambda message: None)
+        # Timestamps count back from midnight, so a rerun on the same day matches
+        self.now = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def run(self):
+        with explicit_timestamps(User, Package, Booking, Rating):
+            agency_ids = self.create_agencies(self.counts['agencies'])
+            guide_ids = self.create_guides(self.counts['guides'])
+            tourist_ids = self.create_tourists(self.counts['tourists'])
+            self.assign_guides(agency_ids, guide_ids)
+            packages = self.create_packages(self.counts['packages'], agency_ids)
+            self.create_bookings(self.counts['bookings'], tourist_ids, guide_ids, agency_ids, packages)
+            self.create_ratings(self.counts['ratings'], tourist_ids, guide_ids, agency_ids, [pk for pk, _ in packages])
+        self.log('Rebuilding agency booking links and rating aggregates')
+        rebuild_agency_booking_links()
+        rebuild_rating_aggregates(batch_size=self.batch_size)
+        return self.counts
+
+    def timestamp(self):
+        return self.now - timedelta(seconds=self.rng.randrange(SPREAD_DAYS * 86400))
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def write(self, model, rows, label=None):
+        """bulk_create ``rows`` in batches; returns the primary keys in order"""
+        rows, ids, written = iter(rows), [], 0
+        while batch := list(islice(rows, self.batch_size)):
+            ids += [obj.pk for obj in model.objects.bulk_create(batch)]
+            written += len(batch)
+            self.log(f'{label or model._meta.verbose_name_plural}: {written}')
+        return ids
+
+    def create_users(self, kind, count, **fields):
+        """Users of one kind; returns their ids"""
+        def rows():
+            for i in range(count):
+                first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+                created = self.timestamp()
+                yield User(
+                    id=self.uuid(), username=f'{SEED_PREFIX}{kind}{i}', email=f'{SEED_PREFIX}{kind}{i}@example.com',
+                    password=self.password, first_name=first, last_name=last,
+                    phone_number=f'98{self.rng.randrange(10 ** 8):08d}', is_verified=True, is_approved=True,
+                    date_joined=created, created_at=created, updated_at=created, **fields,
+                )
+        return self.write(User, rows(), f'{kind} users')
+
+    def create_agencies(self, count):
+        user_ids = self.create_users('agency', count, user_type='agency')
+        return self.write(Agency, (
+            Agency(
+                user_id=user_id, company_name=f'{self.rng.choice(CITIES)} {self.rng.choice(LAST_NAMES)} Travels {i}',
+                agency_type=self.rng.choice(Agency.AGENCY_TYPES)[0], city=self.rng.choice(CITIES), country='Nepal',
+                registration_number=f'{SEED_PREFIX}REG{i}', description='Tours and treks across Nepal',
+                established_year=self.rng.randrange(1990, 2025), operating_regions=self.rng.sample(CITIES, 3),
+            )
+            for i, user_id in enumerate(user_ids)
+        ))
+
+    def create_guides(self, count):
+        user_ids = self.create_users('guide', count, user_type='tourist')
+        def rows():
+            for user_id in user_ids:
+                daily_rate = Decimal(self.rng.randrange(30, 200))
+                yield Guide(
+                    user_id=user_id, languages=['English', *self.rng.sample(LANGUAGES[1:], 2)],
+                    specializations=self.rng.sample(SPECIALIZATIONS, 2), experience_years=self.rng.randrange(25),
+                    daily_rate=daily_rate, hourly_rate=(daily_rate / 8).quantize(Decimal('0.01')),
+                    bio='Licensed guide', total_trips=self.rng.randrange(300),
+                )
+        return self.write(Guide, rows())
+
+    def create_tourists(self, count):
+        user_ids = self.create_users('tourist', count, user_type='tourist')
+        return self.write(Tourist, (
+            Tourist(
+                user_id=user_id, travel_interests=self.rng.sample(INTERESTS, 3),
+                nationality=self.rng.choice(['Nepali', 'Indian', 'American', 'German', 'British', 'Chinese']),
+                preferred_language=self.rng.choice(LANGUAGES),
+            )
+            for user_id in user_ids
+        ))
+
+    def assign_guides(self, agency_ids, guide_ids):
+        """Every guide is managed by one agency, and one in five by a second"""
+        if not agency_ids:
+            return
+        ManagedGuide = Agency.managed_guides.through
+        def rows():
+            for guide_id in guide_ids:
+                for agency_id in self.rng.sample(agency_ids, min(len(agency_ids), 1 + (self.rng.random() < 0.2))):
+                    yield ManagedGuide(agency_id=agency_id, guide_id=guide_id)
+        self.write(ManagedGuide, rows(), 'managed guides')
+
+    def create_packages(self, count, agency_ids):
+        """Returns (id, price) pairs"""
+        if not agency_ids:
+            return []
+        packages = []
+        def rows():
+            for i in range(count):
+                destinations = self.rng.sample(CITIES, self.rng.randrange(1, 4))
+                package_type = self.rng.choice(Package.PACKAGE_TYPES)[0]
+                created = self.timestamp()
+                package = Package(
+                    id=self.uuid(), name=f'{destinations[0]} {package_type.title()} Tour {i}',
+                    description=f'A {package_type} trip through {", ".join(destinations)}',
+                    package_type=package_type, agency_id=self.rng.choice(agency_ids),
+                    duration_days=self.rng.randrange(1, 15), price=Decimal(self.rng.randrange(100, 3000)),
+                    max_people=self.rng.randrange(4, 30), destinations=destinations,
+                    is_active=self.rng.random() < 0.9, created_at=created, updated_at=created,
+                )
+                packages.append((package.pk, package.price))
+                yield package
+        self.write(Package, rows())
+        return packages
+
+    def create_bookings(self, count, tourist_ids, guide_ids, agency_ids, packages):
+        weights = {'package': 6 * bool(packages), 'guide': 3 * bool(guide_ids), 'agency': bool(agency_ids)}
+        if not tourist_ids or not any(weights.values()):
+            return []
+        # Guide bookings follow each other per guide, so no guide is double-booked
+        guide_free = {guide_id: date(2024, 1, 1) + timedelta(days=self.rng.randrange(60)) for guide_id in guide_ids}
+        statuses = [status for status, _ in Booking.BOOKING_STATUS]
+        def rows():
+            for _ in range(count):
+                kind = self.rng.choices(list(weights), weights=list(weights.values()))[0]
+                days, people = self.rng.randrange(1, 10), self.rng.randrange(1, 6)
+                booking = Booking(
+                    id=self.uuid(), tourist_id=self.rng.choice(tourist_ids), booking_type=kind,
+                    status=self.rng.choices(statuses, weights=[2, 4, 1, 6, 1])[0], number_of_people=people,
+                )
+                if kind == 'package':
+                    booking.package_id, price = self.rng.choice(packages)
+                    booking.start_date = date(2024, 1, 1) + timedelta(days=self.rng.randrange(SPREAD_DAYS))
+                    booking.total_price = price * people
+                elif kind == 'guide':
+                    booking.guide_id = self.rng.choice(guide_ids)
+                    booking.start_date = guide_free[booking.guide_id] + timedelta(days=self.rng.randrange(14))
+                    booking.total_price = Decimal(self.rng.randrange(30, 200)) * days
+                else:
+                    booking.agency_id = self.rng.choice(agency_ids)
+                    booking.start_date = date(2024, 1, 1) + timedelta(days=self.rng.randrange(SPREAD_DAYS))
+                    booking.total_price = Decimal(self.rng.randrange(200, 5000))
+                booking.end_date = booking.start_date + timedelta(days=days)
+                if kind == 'guide':
+                    guide_free[booking.guide_id] = booking.end_date + timedelta(days=1)
+                booking.created_at = booking.updated_at = self.timestamp()
+                yield booking
+        return self.write(Booking, rows())
+
+    def create_ratings(self, count, tourist_ids, guide_ids, agency_ids, package_ids):
+        """Ratings by distinct (tourist, target) pairs"""
+        targets = [('package', pk) for pk in package_ids] + [('guide', pk) for pk in guide_ids] \
+            + [('agency', pk) for pk in agency_ids]
+        if not tourist_ids or not targets:
+            return []
+        self.rng.shuffle(targets)
+        count = min(count, len(tourist_ids) * len(targets))
+        def rows():
+            for i in range(count):
+                rating_type, target_id = targets[i % len(targets)]
+                yield Rating(
+                    # Each pass over the targets moves every target on to its next tourist
+                    id=self.uuid(), tourist_id=tourist_ids[(i % len(targets) * 7919 + i // len(targets)) % len(tourist_ids)],
+                    rating_type=rating_type, **{f'{rating_type}_id': target_id},
+                    rating=self.rng.choices(range(1, 6), weights=[1, 1, 3, 6, 8])[0],
+                    review=self.rng.choice(REVIEWS), created_at=self.timestamp(),
+                )
+        return self.write(Rating, rows())
+
+
+def has_seed_data():
+    return User.objects.filter(username__startswith=SEED_PREFIX).exists()
+
+
+def clear_seed_data():
+    """Delete everything a previous seed created. Returns the number of rows deleted"""
+    deleted, _ = User.objects.filter(username__startswith=SEED_PREFIX).delete()
+    return deleted
@@ -1,11 +1,18 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from .models import (
     User, Tourist, Guide, Agency, Package, Booking, Rating, 
 )
 from .oauth_utils import GoogleOAuth, FacebookOAuth, SocialAuthUtils
+from .authentication import add_claims
+from .availability import MAX_BOOKING_DAYS
+from .dynamic_fields import DynamicFieldsMixin
+from .revocation import is_token_revoked, revoke_token
 
 
 # Custom JWT Token Serializer
@@ -14,14 +21,8 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     def get_token(cls, user):
         token = super().get_token(user)
         
-        # Add custom claims
-        token['user_type'] = user.user_type
-        token['username'] = user.username
-        token['email'] = user.email
-        token['is_verified'] = user.is_verified
-        token['is_approved'] = user.is_approved
-        
-        return token
+        # Add custom claims; every token the API issues is built here
+        return add_claims(token, user)
     
     def validate(self, attrs):
         data = super().validate(attrs)
@@ -42,6 +43,32 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         return data
     
 
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Token refresh that refuses revoked refresh tokens and issues access tokens
+    with the user's current claims.
+    """
+    
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if is_token_revoked(refresh):
+            raise TokenError('Token is revoked')
+        
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        
+        data = {'access': str(add_claims(refresh.access_token, user))}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                revoke_token(refresh)
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
+    
+
 # User Authentication Serializers
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, validators=[validate_password])
@@ -108,7 +135,7 @@ class UserLoginSerializer(serializers.Serializer):
             raise serializers.ValidationError('Must include username and password')
         
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 
@@ -117,53 +144,62 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'is_verified', 'is_approved')
 
 # Profile Serializers
-class TouristSerializer(serializers.ModelSerializer):
+# Expanded guides and agencies are limited to those the public listings show
+VISIBLE_PROFILES = {'user__is_approved': True, 'user__is_active': True}
+
+class TouristSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     
     class Meta:
         model = Tourist
         fields = '__all__'
 
-class GuideSerializer(serializers.ModelSerializer):
+class GuideSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    expandable_fields = {'agencies': ('AgencyListSerializer', {'many': True, 'read_only': True}, VISIBLE_PROFILES)}
     
     class Meta:
         model = Guide
         fields = '__all__'
+        read_only_fields = ('average_rating', 'rating_sum', 'rating_count')
         
-class GuideListSerializer(serializers.ModelSerializer):
+class GuideListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    expandable_fields = {'agencies': ('AgencyListSerializer', {'many': True, 'read_only': True}, VISIBLE_PROFILES)}
     
     class Meta:
         model = Guide
         fields = ('id', 'user', 'languages', 'specializations', 'hourly_rate', 
                  'daily_rate', 'experience_years', 'average_rating', 'total_trips')
 
-class AgencySerializer(serializers.ModelSerializer):
+class AgencySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     managed_guides = GuideListSerializer(many=True, read_only=True)
     
     class Meta:
         model = Agency
         fields = '__all__'
+        read_only_fields = ('average_rating', 'rating_sum', 'rating_count')
 
-class AgencyListSerializer(serializers.ModelSerializer):
+class AgencyListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    expandable_fields = {'managed_guides': (GuideListSerializer, {'many': True, 'read_only': True}, VISIBLE_PROFILES)}
     
     class Meta:
         model = Agency
         fields = ('id', 'user', 'company_name', 'address', 'website', 
                  'average_rating', 'total_bookings', 'description')
 
-class PackageSerializer(serializers.ModelSerializer):
+class PackageSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     agency = AgencyListSerializer(read_only=True)
     
     class Meta:
         model = Package
-        fields = '__all__'
-        read_only_fields = ('id', 'average_rating', 'total_bookings', 'created_at', 'updated_at')
+        exclude = ('search_vector',)
+        read_only_fields = ('id', 'average_rating', 'rating_sum', 'rating_count', 'total_bookings',
+                            'created_at', 'updated_at')
 
-class PackageListSerializer(serializers.ModelSerializer):
+class PackageListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     agency = AgencyListSerializer(read_only=True)
     
     class Meta:
@@ -172,7 +208,15 @@ class PackageListSerializer(serializers.ModelSerializer):
                  'duration_days', 'price', 'max_people', 'destinations', 
                  'images', 'average_rating', 'total_bookings')
 
-class BookingSerializer(serializers.ModelSerializer):
+class PackageSearchSerializer(PackageListSerializer):
+    """Package list entry with full-text search relevance and snippet"""
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.CharField(read_only=True)
+    
+    class Meta(PackageListSerializer.Meta):
+        fields = PackageListSerializer.Meta.fields + ('rank', 'headline')
+
+class BookingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     tourist = TouristSerializer(read_only=True)
     package = PackageListSerializer(read_only=True)
     guide = GuideListSerializer(read_only=True)
@@ -212,9 +256,14 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         elif booking_type == 'agency' and not attrs.get('agency'):
             raise serializers.ValidationError("Agency is required for agency booking")
         
+        if attrs['end_date'] < attrs['start_date']:
+            raise serializers.ValidationError("End date cannot be before start date")
+        if (attrs['end_date'] - attrs['start_date']).days + 1 > MAX_BOOKING_DAYS:
+            raise serializers.ValidationError(f"Bookings are limited to {MAX_BOOKING_DAYS} days")
+        
         return attrs
 
-class RatingSerializer(serializers.ModelSerializer):
+class RatingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     tourist = TouristSerializer(read_only=True)
     package = PackageListSerializer(read_only=True)
     guide = GuideListSerializer(read_only=True)
@@ -0,0 +1,93 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import forget_auth_version, publish_auth_version_on_commit
+from .cache import HOMEPAGE_CACHE, invalidate_on_commit
+from .models import Agency, Booking, ClaimsUser, Guide, Package, Rating, User
+from .ownership import OWNER_FIELDS, link_guide_bookings, sync_booking_owners, unlink_guide_bookings
+from .ratings import apply_rating_deltas, rating_deltas
+
+# User fields that change what the homepage shows (visibility and UserSerializer output)
+HOMEPAGE_USER_FIELDS = {
+    'is_active', 'is_approved', 'is_verified', 'username', 'email', 'first_name', 'last_name',
+    'user_type', 'phone_number', 'profile_image',
+}
+
+
+@receiver([post_save, post_delete], sender=Package)
+@receiver([post_save, post_delete], sender=Guide)
+@receiver([post_save, post_delete], sender=Agency)
+def invalidate_homepage(sender, **kwargs):
+    invalidate_on_commit(HOMEPAGE_CACHE)
+
+
+# Signals from proxy instances are sent with the proxy as sender
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=ClaimsUser)
+def invalidate_homepage_on_user_change(sender, update_fields=None, **kwargs):
+    if update_fields is None or HOMEPAGE_USER_FIELDS.intersection(update_fields):
+        invalidate_on_commit(HOMEPAGE_CACHE)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=ClaimsUser)
+def publish_auth_version(sender, instance, raw=False, **kwargs):
+    if not raw and getattr(instance, '_auth_version_changed', False):
+        publish_auth_version_on_commit(instance)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=ClaimsUser)
+def forget_deleted_user_auth_version(sender, instance, **kwargs):
+    forget_auth_version(instance.pk)
+
+
+@receiver(pre_save, sender=Rating)
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    """Keep the stored score and targets so post_save can apply the difference"""
+    instance._previous_rating_state = None
+    if raw or instance._state.adding:
+        return
+    previous = Rating.objects.only('rating', *Rating.TARGET_FIELDS).filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._previous_rating_state = (previous.rating, previous.get_targets())
+
+
+@receiver(post_save, sender=Rating)
+def update_rating_aggregates_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = (instance.rating, instance.get_targets())
+    previous = None if created else getattr(instance, '_previous_rating_state', None)
+    apply_rating_deltas(rating_deltas(previous, current))
+    # Aggregates are written with update(), which sends no signals of its own
+    invalidate_on_commit(HOMEPAGE_CACHE)
+
+
+@receiver(post_delete, sender=Rating)
+def update_rating_aggregates_on_delete(sender, instance, **kwargs):
+    apply_rating_deltas(rating_deltas(old=(instance.rating, instance.get_targets())))
+    invalidate_on_commit(HOMEPAGE_CACHE)
+
+
+@receiver(post_save, sender=Booking)
+def sync_booking_owners_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created or update_fields is None or set(OWNER_FIELDS).intersection(update_fields):
+        sync_booking_owners(instance, created)
+
+
+@receiver(m2m_changed, sender=Agency.managed_guides.through)
+def sync_guide_booking_owners(sender, instance, action, reverse, pk_set, **kwargs):
+    """Follow managed_guides changes from either side (agency.managed_guides or guide.agencies)"""
+    agency_ids, guide_ids = (pk_set, [instance.pk]) if reverse else ([instance.pk], pk_set)
+    if action == 'post_add':
+        link_guide_bookings(agency_ids, guide_ids)
+    elif action == 'post_remove':
+        unlink_guide_bookings(agency_ids, guide_ids)
+    elif action == 'pre_clear':
+        if reverse:
+            unlink_guide_bookings(guide_ids=guide_ids)
+        else:
+            unlink_guide_bookings(agency_ids=agency_ids)
@@ -1,3 +1,1907 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Barrier, Lock, Thread
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from django.contrib import admin
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from google.auth import crypt, jwt
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import authentication, oauth_utils, revocation, serializers, views
+from .approvals import MAX_BATCH_AGENCIES
+from .authentication import (
+    AUTH_VERSION_LOCAL_TTL, AUTH_VERSION_SHARED_TTL, VERSION_CLAIM, ClaimsJWTAuthentication,
+    remember_auth_version, shared_version_ttl,
+)
+from .availability import MAX_BOOKING_DAYS
+from .cache import HOMEPAGE_CACHE, invalidate
+from .fast_serializers import get_values_serializer
+from .filters import GuideFilterSet, PackageSearchFilter
+from .media_jobs import (
+    AVATAR_SIZES, MAX_ATTEMPTS, RETRY_BASE_DELAY, avatar_name, claim_jobs, fetch_avatars, finish_job,
+    process_media_jobs,
+)
+from .models import User, Tourist, Guide, Agency, AgencyBooking, Package, Booking, MediaJob, Rating, RevokedToken
+from .oauth_clients import close_client, get_client, run_on_provider_loop
+from .oauth_utils import FacebookOAuth, GoogleOAuth, SocialAuthUtils
+from .ownership import rebuild_agency_booking_links
+from .pagination import EstimatedCountPaginator
+from .seeding import Seeder
+from .serializers import CustomTokenObtainPairSerializer
+
+def create_agency(index, approved=True):
+    user = User.objects.create_user(
+        username=f'agency{index}', email=f'agency{index}@example.com',
+        user_type='agency', is_approved=approved, is_verified=approved,
+    )
+    return Agency.objects.create(user=user, company_name=f'Agency {index}')
+
+
+def create_guide(index):
+    user = User.objects.create_user(
+        username=f'guide{index}', email=f'guide{index}@example.com',
+        user_type='tourist', first_name='Guide', last_name=str(index),
+    )
+    return Guide.objects.create(user=user, languages=['English'], daily_rate=Decimal('50.00'))
+
+
+def create_tourist(index):
+    user = User.objects.create_user(
+        username=f'tourist{index}', email=f'tourist{index}@example.com',
+        user_type='tourist',
+    )
+    return Tourist.objects.create(user=user)
+
+
+def create_package(agency, index):
+    return Package.objects.create(
+        name=f'Package {index}', description='A trip', package_type='adventure',
+        agency=agency, duration_days=3, price=Decimal('100.00'), destinations=['Pokhara'],
+    )
+
+
+class ListQueryCountTests(TestCase):
+    """List and detail endpoints must not issue one query per row"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url, grow):
+        before = self.count_queries(url)
+        grow()
+        self.assertEqual(self.count_queries(url), before)
+
+    def test_package_list(self):
+        agency = create_agency(0)
+        create_package(agency, 0)
+
+        def grow():
+            for i in range(1, 8):
+                create_package(create_agency(i), i)
+        self.assertConstantQueries('/api/packages/', grow)
+
+    def test_guide_list(self):
+        create_guide(0)
+        self.assertConstantQueries('/api/guides/', lambda: [create_guide(i) for i in range(1, 8)])
+
+    def test_agency_list(self):
+        create_agency(0)
+        self.assertConstantQueries('/api/agencies/', lambda: [create_agency(i) for i in range(1, 8)])
+
+    def test_agency_packages(self):
+        agency = create_agency(0)
+        create_package(agency, 0)
+        self.assertConstantQueries(
+            f'/api/agencies/{agency.id}/packages/',
+            lambda: [create_package(agency, i) for i in range(1, 6)],
+        )
+
+    def test_agency_ratings(self):
+        agency = create_agency(0)
+        Rating.objects.create(tourist=create_tourist(0), rating_type='agency', agency=agency, rating=4)
+
+        def grow():
+            for i in range(1, 6):
+                Rating.objects.create(
+                    tourist=create_tourist(i), rating_type='agency', agency=agency, rating=5
+                )
+        self.assertConstantQueries(f'/api/agencies/{agency.id}/ratings/', grow)
+
+    def test_homepage(self):
+        agency = create_agency(0)
+        create_package(agency, 0)
+        create_guide(0)
+
+        def grow():
+            for i in range(1, 6):
+                create_package(create_agency(i), i)
+                create_guide(i)
+        self.assertConstantQueries('/api/homepage/content/', grow)
+
+
+# Endpoint benchmark suite
+#
+# Seeds a dataset scaled by BENCHMARK_SCALE, calls every route in core/urls.py
+# in-process and compares SQL query counts and wall time against
+# core/benchmark_baseline.json. Set BENCHMARK_UPDATE_BASELINE=1 to rewrite the
+# baseline, BENCHMARK_TIME_TOLERANCE to change the allowed slowdown factor and
+# BENCHMARK_REPORT=<path> to dump the measured numbers (of this and the other
+# benchmarks below) as JSON.
+
+BENCHMARK_BASELINE = Path(__file__).resolve().parent / 'benchmark_baseline.json'
+BENCHMARK_PASSWORD = 'Bench-pass-123'
+
+
+def seed_benchmark_data(scale=1):
+    """Create a dataset whose size grows linearly with ``scale``"""
+    password = make_password(BENCHMARK_PASSWORD)
+    users = []
+    for kind, count in (('agency', 5 * scale), ('guide', 10 * scale), ('tourist', 10 * scale)):
+        for i in range(count):
+            users.append(User(
+                username=f'bench_{kind}{i}', email=f'bench_{kind}{i}@example.com', password=password,
+                first_name=kind.title(), last_name=str(i),
+                user_type='tourist' if kind == 'guide' else kind,
+                is_approved=True, is_verified=True,
+            ))
+    User.objects.bulk_create(users)
+    by_type = {}
+    for user in users:
+        by_type.setdefault(user.username.rstrip('0123456789'), []).append(user)
+
+    agencies = Agency.objects.bulk_create([
+        Agency(user=user, company_name=f'Bench Agency {i}', address='Thamel', description='Tours')
+        for i, user in enumerate(by_type['bench_agency'])
+    ])
+    guides = Guide.objects.bulk_create([
+        Guide(user=user, languages=['English', 'Nepali'], specializations=['trekking'],
+              daily_rate=Decimal('40.00'), hourly_rate=Decimal('8.00'))
+        for user in by_type['bench_guide']
+    ])
+    tourists = Tourist.objects.bulk_create([Tourist(user=user) for user in by_type['bench_tourist']])
+    for i, agency in enumerate(agencies):
+        agency.managed_guides.add(*guides[i::len(agencies)])
+
+    packages = Package.objects.bulk_create([
+        Package(name=f'Bench Package {i}', description='Trek through the hills',
+                package_type=Package.PACKAGE_TYPES[i % len(Package.PACKAGE_TYPES)][0],
+                agency=agencies[i % len(agencies)], duration_days=1 + i % 7,
+                price=Decimal('100.00') + i, destinations=['Pokhara', 'Kathmandu'])
+        for i in range(20 * scale)
+    ])
+    start = date(2026, 1, 1)
+    bookings = []
+    for i in range(40 * scale):
+        booking = Booking(tourist=tourists[i % len(tourists)], start_date=start + timedelta(days=i),
+                          end_date=start + timedelta(days=i + 2), total_price=Decimal('120.00'))
+        if i % 2:
+            booking.booking_type, booking.package = 'package', packages[i % len(packages)]
+        else:
+            booking.booking_type, booking.guide = 'guide', guides[i % len(guides)]
+        bookings.append(booking)
+    Booking.objects.bulk_create(bookings)
+    # bulk_create sends no signals, so derive the ownership links in one statement
+    rebuild_agency_booking_links()
+    Rating.objects.bulk_create([
+        Rating(tourist=tourists[i % len(tourists)], rating_type='package',
+               package=packages[i // len(tourists) % len(packages)], rating=1 + i % 5, review='Nice')
+        for i in range(20 * scale)
+    ] + [
+        Rating(tourist=tourist, rating_type='guide', guide=guides[0], rating=4)
+        for tourist in tourists
+    ] + [
+        Rating(tourist=tourist, rating_type='agency', agency=agencies[0], rating=5)
+        for tourist in tourists
+    ])
+
+    admin = User.objects.create_user(
+        username='bench_admin', email='bench_admin@example.com', user_type='admin',
+        is_staff=True, is_superuser=True,
+    )
+    admin.password = password
+    admin.save(update_fields=['password'])
+    pending = User.objects.create_user(
+        username='bench_pending', email='bench_pending@example.com', user_type='agency',
+    )
+    return {
+        'admin': admin,
+        'agency_user': by_type['bench_agency'][0],
+        'tourist_user': by_type['bench_tourist'][0],
+        'agency': agencies[0],
+        'pending_agency': Agency.objects.create(user=pending, company_name='Pending Agency'),
+        'guide': guides[0],
+        'unmanaged_guide': Guide.objects.create(user=User.objects.create_user(
+            username='bench_free_guide', email='bench_free_guide@example.com')),
+        'package': packages[0],
+        'tourist': tourists[0],
+        'booking': bookings[0],
+        'guide_ids': ','.join(str(guide.id) for guide in guides[:20]),
+    }
+
+
+def record_benchmark(section, results):
+    """Merge results into the JSON report named by BENCHMARK_REPORT, if set"""
+    report_path = os.environ.get('BENCHMARK_REPORT')
+    if not report_path:
+        return
+    path = Path(report_path)
+    report = json.loads(path.read_text()) if path.exists() else {}
+    report[section] = results
+    path.write_text(json.dumps(report, indent=2, sort_keys=True))
+
+
+def _tokens(user):
+    refresh = CustomTokenObtainPairSerializer.get_token(user)
+    return {'access': str(refresh.access_token), 'refresh': str(refresh)}
+
+
+# (name, method, path, authenticated role, payload, expected status)
+BENCHMARK_ENDPOINTS = [
+    ('auth-register', 'post', '/api/auth/register/', None, lambda d: {
+        'username': 'bench_new', 'email': 'bench_new@example.com', 'password': BENCHMARK_PASSWORD,
+        'password_confirm': BENCHMARK_PASSWORD, 'first_name': 'New', 'last_name': 'User',
+        'phone_number': '9800000000', 'user_type': 'tourist',
+    }, 201),
+    ('auth-login', 'post', '/api/auth/login/', None, lambda d: {
+        'email': d['tourist_user'].email, 'password': BENCHMARK_PASSWORD,
+    }, 200),
+    ('auth-logout', 'post', '/api/auth/logout/', 'tourist_user', lambda d: {
+        'refresh': _tokens(d['tourist_user'])['refresh'],
+    }, 200),
+    ('auth-profile', 'get', '/api/auth/profile/', 'agency_user', None, 200),
+    ('token-obtain', 'post', '/api/token/', None, lambda d: {
+        'email': d['tourist_user'].email, 'password': BENCHMARK_PASSWORD,
+    }, 200),
+    ('token-refresh', 'post', '/api/token/refresh/', None, lambda d: {
+        'refresh': _tokens(d['tourist_user'])['refresh'],
+    }, 200),
+    ('profile-tourist', 'get', '/api/profile/tourist/', 'tourist_user', None, 200),
+    ('profile-tourist-update', 'put', '/api/profile/tourist/', 'tourist_user',
+     lambda d: {'nationality': 'Nepali'}, 200),
+    ('profile-agency', 'get', '/api/profile/agency/', 'agency_user', None, 200),
+    ('guide-list', 'get', '/api/guides/', None, None, 200),
+    ('guide-list-cursor', 'get', '/api/guides/?cursor=', None, None, 200),
+    ('guide-detail', 'get', '/api/guides/{guide.id}/', None, None, 200),
+    ('guide-agencies', 'get', '/api/guides/{guide.id}/agencies/', None, None, 200),
+    ('guide-ratings', 'get', '/api/guides/{guide.id}/ratings/', None, None, 200),
+    ('guide-availability', 'get',
+     '/api/guides/{guide.id}/availability/?start_date=2026-01-01&end_date=2026-03-31', None, None, 200),
+    ('guide-batch-availability', 'get',
+     '/api/guides/batch_availability/?ids={guide_ids}&start_date=2026-01-01&end_date=2026-03-31',
+     None, None, 200),
+    ('agency-list', 'get', '/api/agencies/', None, None, 200),
+    ('agency-list-cursor', 'get', '/api/agencies/?cursor=', None, None, 200),
+    ('agency-detail', 'get', '/api/agencies/{agency.id}/', None, None, 200),
+    ('agency-detail-sparse', 'get', '/api/agencies/{agency.id}/?fields=id,company_name,average_rating', None, None, 200),
+    ('agency-guides', 'get', '/api/agencies/{agency.id}/guides/', None, None, 200),
+    ('agency-packages', 'get', '/api/agencies/{agency.id}/packages/', None, None, 200),
+    ('agency-ratings', 'get', '/api/agencies/{agency.id}/ratings/', None, None, 200),
+    ('package-list', 'get', '/api/packages/', None, None, 200),
+    ('package-list-cursor', 'get', '/api/packages/?cursor=', None, None, 200),
+    ('package-list-sparse', 'get', '/api/packages/?fields=id,name,price,agency.company_name', None, None, 200),
+    ('package-search', 'get', '/api/packages/?q=pokhara+hills', None, None, 200),
+    ('package-detail', 'get', '/api/packages/{package.id}/', None, None, 200),
+    ('package-agencies', 'get', '/api/packages/{package.id}/agencies/', None, None, 200),
+    ('package-ratings', 'get', '/api/packages/{package.id}/ratings/', None, None, 200),
+    ('homepage-content', 'get', '/api/homepage/content/', None, None, 200),
+    ('tourist-booking-list', 'get', '/api/tourist/bookings/', 'tourist_user', None, 200),
+    ('tourist-booking-detail', 'get', '/api/tourist/bookings/{booking.id}/', 'tourist_user', None, 200),
+    ('tourist-booking-create', 'post', '/api/tourist/bookings/', 'tourist_user', lambda d: {
+        'booking_type': 'guide', 'guide': d['guide'].id,
+        'start_date': '2027-03-01', 'end_date': '2027-03-03', 'number_of_people': 2,
+    }, 201),
+    ('tourist-rating-list', 'get', '/api/tourist/ratings/', 'tourist_user', None, 200),
+    ('tourist-rating-create', 'post', '/api/tourist/ratings/', 'tourist_user', lambda d: {
+        'rating_type': 'guide', 'guide': d['unmanaged_guide'].id, 'rating': 5, 'review': 'Great',
+    }, 201),
+    ('agency-manage-packages', 'get', '/api/agency/manage/packages/', 'agency_user', None, 200),
+    ('agency-manage-package-create', 'post', '/api/agency/manage/packages/', 'agency_user', lambda d: {
+        'name': 'New Package', 'description': 'Lakeside', 'package_type': 'city',
+        'duration_days': 2, 'price': '80.00',
+    }, 201),
+    ('agency-manage-guides', 'get', '/api/agency/manage/guides/', 'agency_user', None, 200),
+    ('agency-manage-guide-add', 'post', '/api/agency/manage/guides/', 'agency_user',
+     lambda d: {'guide_id': d['unmanaged_guide'].id}, 200),
+    ('agency-manage-bookings', 'get', '/api/agency/manage/bookings/', 'agency_user', None, 200),
+    ('agency-manage-bookings-stream', 'get', '/api/agency/manage/bookings/?stream=true', 'agency_user', None, 200),
+    ('admin-pending-agencies', 'get', '/api/admin/pending_agencies/', 'admin', None, 200),
+    ('admin-approve-agency', 'post', '/api/admin/approve_agency/', 'admin',
+     lambda d: {'agency_id': d['pending_agency'].id}, 200),
+    ('admin-reject-agency', 'post', '/api/admin/reject_agency/', 'admin',
+     lambda d: {'agency_id': d['pending_agency'].id}, 200),
+    ('admin-approve-agencies', 'post', '/api/admin/approve_agencies/', 'admin',
+     lambda d: {'agency_ids': [d['pending_agency'].id, d['agency'].id]}, 200),
+    ('admin-reject-agencies', 'post', '/api/admin/reject_agencies/', 'admin',
+     lambda d: {'agency_ids': [d['pending_agency'].id, d['agency'].id]}, 200),
+]
+
+
+class EndpointBenchmarkTests(TestCase):
+    """Query-count and latency regression guard for every API route"""
+    scale = int(os.environ.get('BENCHMARK_SCALE', 1))
+    repeat = int(os.environ.get('BENCHMARK_REPEAT', 5))
+    time_tolerance = float(os.environ.get('BENCHMARK_TIME_TOLERANCE', 2.0))
+    time_slack_ms = float(os.environ.get('BENCHMARK_TIME_SLACK_MS', 20))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_benchmark_data(cls.scale)
+        cls.access = {
+            role: _tokens(cls.data[role])['access'] for role in ('admin', 'agency_user', 'tourist_user')
+        }
+
+    def measure(self, method, path, role, payload):
+        client = APIClient()
+        if role:
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access[role]}')
+        timings = []
+        for _ in range(self.repeat):
+            body = payload(self.data) if payload else None
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(path, body, format='json')
+                    if response.streaming:
+                        # Streamed bodies are produced lazily, so read them inside the measurement
+                        response.getvalue()
+                    timings.append((time.perf_counter() - started) * 1000)
+                transaction.set_rollback(True)
+        return response, len(ctx.captured_queries), statistics.median(timings)
+
+    def test_endpoints_against_baseline(self):
+        results = {}
+        for name, method, path, role, payload, expected_status in BENCHMARK_ENDPOINTS:
+            response, queries, elapsed = self.measure(method, path.format(**self.data), role, payload)
+            self.assertEqual(response.status_code, expected_status, f'{name}: {response.getvalue()[:300]}')
+            results[name] = {'queries': queries, 'time_ms': round(elapsed, 2)}
+
+        record_benchmark('endpoints', results)
+        if os.environ.get('BENCHMARK_UPDATE_BASELINE'):
+            BENCHMARK_BASELINE.write_text(
+                json.dumps({'scale': self.scale, 'endpoints': results}, indent=2, sort_keys=True) + '\n'
+            )
+            return
+
+        baseline = json.loads(BENCHMARK_BASELINE.read_text())
+        compare_times = baseline['scale'] == self.scale
+        failures = []
+        for name, result in results.items():
+            expected = baseline['endpoints'].get(name)
+            if expected is None:
+                failures.append(f'{name}: no baseline entry, rerun with BENCHMARK_UPDATE_BASELINE=1')
+                continue
+            if result['queries'] > expected['queries']:
+                failures.append(f"{name}: {result['queries']} queries, baseline {expected['queries']}")
+            limit = expected['time_ms'] * self.time_tolerance + self.time_slack_ms
+            if compare_times and result['time_ms'] > limit:
+                failures.append(f"{name}: {result['time_ms']}ms, limit {limit:.2f}ms")
+        self.assertFalse(failures, '\n'.join(failures))
+
+
+class RatingAggregateTests(TestCase):
+    """Rating writes keep sum, count and average in step on the rated object"""
+
+    def setUp(self):
+        self.package = create_package(create_agency(0), 0)
+        self.tourists = [create_tourist(i) for i in range(3)]
+
+    def rate(self, tourist, score):
+        return Rating.objects.create(
+            tourist=tourist, rating_type='package', package=self.package, rating=score
+        )
+
+    def assertAggregates(self, total, count, average):
+        self.package.refresh_from_db()
+        self.assertEqual(
+            (self.package.rating_sum, self.package.rating_count, self.package.average_rating),
+            (total, count, Decimal(average)),
+        )
+
+    def test_create_update_delete(self):
+        first = self.rate(self.tourists[0], 5)
+        self.rate(self.tourists[1], 4)
+        self.assertAggregates(9, 2, '4.50')
+
+        first.rating = 2
+        first.save()
+        self.assertAggregates(6, 2, '3.00')
+
+        first.delete()
+        self.assertAggregates(4, 1, '4.00')
+
+    def test_moving_rating_to_another_target(self):
+        rating = self.rate(self.tourists[0], 3)
+        guide = create_guide(0)
+        rating.rating_type, rating.package, rating.guide = 'guide', None, guide
+        rating.save()
+        self.assertAggregates(0, 0, '0.00')
+        guide.refresh_from_db()
+        self.assertEqual((guide.rating_sum, guide.rating_count, guide.average_rating), (3, 1, Decimal('3.00')))
+
+    def test_rating_endpoint_updates_ordering_field(self):
+        client = APIClient()
+        client.force_authenticate(self.tourists[0].user)
+        response = client.post('/api/tourist/ratings/', {
+            'rating_type': 'package', 'package': str(self.package.id), 'rating': 4,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertAggregates(4, 1, '4.00')
+
+    def test_rebuild_command(self):
+        for tourist, score in zip(self.tourists, (5, 4, 4)):
+            self.rate(tourist, score)
+        Package.objects.update(rating_sum=0, rating_count=0, average_rating=0)
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+        self.assertAggregates(13, 3, '4.33')
+
+
+class GuideAvailabilityTests(TestCase):
+    """Availability is computed from overlapping, non-cancelled bookings"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.guide = create_guide(0)
+        self.tourist = create_tourist(0)
+
+    def book(self, start, end, guide=None, status='confirmed'):
+        return Booking.objects.create(
+            tourist=self.tourist, booking_type='guide', guide=guide or self.guide, status=status,
+            start_date=date.fromisoformat(start), end_date=date.fromisoformat(end),
+            total_price=Decimal('100.00'),
+        )
+
+    def test_calendar_merges_bookings_and_ignores_cancelled(self):
+        self.book('2026-05-01', '2026-05-03')
+        self.book('2026-05-04', '2026-05-05')
+        self.book('2026-05-20', '2026-06-02')
+        self.book('2026-05-10', '2026-05-12', status='cancelled')
+        self.book('2026-04-01', '2026-04-03')
+
+        response = self.client.get(
+            f'/api/guides/{self.guide.id}/availability/?start_date=2026-05-01&end_date=2026-05-31'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['booked'], [
+            {'start_date': date(2026, 5, 1), 'end_date': date(2026, 5, 5)},
+            {'start_date': date(2026, 5, 20), 'end_date': date(2026, 5, 31)},
+        ])
+        self.assertEqual(response.data['free'], [
+            {'start_date': date(2026, 5, 6), 'end_date': date(2026, 5, 19)},
+        ])
+        self.assertEqual((response.data['booked_days'], response.data['free_days']), (17, 14))
+
+    def test_invalid_window(self):
+        url = f'/api/guides/{self.guide.id}/availability/'
+        self.assertEqual(self.client.get(url + '?start_date=2026-05-02&end_date=2026-05-01').status_code, 400)
+        self.assertEqual(self.client.get(url + '?start_date=2026-01-01&end_date=2028-01-01').status_code, 400)
+        self.assertEqual(self.client.get(url + '?start_date=tomorrow').status_code, 400)
+
+    def test_oversized_booking_is_rejected_before_locking(self):
+        self.client.force_authenticate(self.tourist.user)
+        start = date(2027, 1, 1)
+        payload = {'booking_type': 'guide', 'guide': self.guide.id, 'start_date': start.isoformat()}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/tourist/bookings/', {
+                **payload, 'end_date': (start + timedelta(days=20 * 365)).isoformat(),
+            }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse([q for q in ctx.captured_queries if 'pg_advisory_xact_lock' in q['sql']])
+        response = self.client.post('/api/tourist/bookings/', {
+            **payload, 'end_date': (start + timedelta(days=MAX_BOOKING_DAYS - 1)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_batch_uses_constant_queries(self):
+        guides = [self.guide] + [create_guide(i) for i in range(1, 6)]
+        for guide in guides:
+            self.book('2026-05-01', '2026-05-02', guide=guide)
+        ids = ','.join(str(guide.id) for guide in guides)
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                f'/api/guides/batch_availability/?ids={ids}&start_date=2026-05-01&end_date=2026-05-07'
+            )
+        self.assertEqual([entry['guide_id'] for entry in response.data['guides']], [g.id for g in guides])
+        self.assertTrue(all(entry['booked_days'] == 2 for entry in response.data['guides']))
+
+
+class ConcurrentGuideBookingTests(TransactionTestCase):
+    """Guide reservations serialize only when their date ranges overlap"""
+    threads = int(os.environ.get('BENCHMARK_BOOKING_THREADS', 8))
+    bookings_per_thread = int(os.environ.get('BENCHMARK_BOOKINGS_PER_THREAD', 5))
+
+    def setUp(self):
+        self.guides = [create_guide(i) for i in range(self.threads)]
+        self.tourists = [create_tourist(i) for i in range(self.threads)]
+
+    def run_concurrently(self, plans):
+        """Run one list of (guide, start, end) bookings per thread; return statuses and bookings/s"""
+        barrier = Barrier(len(plans))
+        statuses = []
+
+        def worker(tourist, plan):
+            client = APIClient()
+            client.force_authenticate(tourist.user)
+            try:
+                barrier.wait()
+                for guide, start, end in plan:
+                    response = client.post('/api/tourist/bookings/', {
+                        'booking_type': 'guide', 'guide': guide.id,
+                        'start_date': start.isoformat(), 'end_date': end.isoformat(),
+                    }, format='json')
+                    statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        workers = [Thread(target=worker, args=(tourist, plan)) for tourist, plan in zip(self.tourists, plans)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return statuses, round(len(statuses) / elapsed, 1)
+
+    def week_plan(self, guide, offset=0):
+        first = date(2027, 1, 1) + timedelta(days=offset)
+        return [
+            (guide, first + timedelta(days=7 * i), first + timedelta(days=7 * i + 2))
+            for i in range(self.bookings_per_thread)
+        ]
+
+    def test_overlapping_requests_book_once(self):
+        plan = [(self.guides[0], date(2027, 1, 10), date(2027, 1, 14))]
+        statuses, _ = self.run_concurrently([plan] * self.threads)
+        self.assertEqual(sorted(statuses), [201] + [400] * (self.threads - 1))
+        self.assertEqual(Booking.objects.filter(guide=self.guides[0]).count(), 1)
+
+    def test_throughput(self):
+        results = {}
+        # Every thread books its own guide: no lock is shared
+        statuses, results['separate_guides_per_s'] = self.run_concurrently(
+            [self.week_plan(guide) for guide in self.guides]
+        )
+        self.assertEqual(set(statuses), {201})
+        # One guide, disjoint days per thread: still no shared day lock
+        statuses, results['same_guide_disjoint_days_per_s'] = self.run_concurrently(
+            [self.week_plan(self.guides[0], offset=400 + 7 * self.bookings_per_thread * i)
+             for i in range(self.threads)]
+        )
+        self.assertEqual(set(statuses), {201})
+        # One guide, identical days: requests serialize and all but the first are rejected
+        statuses, results['same_guide_same_days_per_s'] = self.run_concurrently(
+            [self.week_plan(self.guides[1], offset=900)] * self.threads
+        )
+        self.assertEqual(statuses.count(201), self.bookings_per_thread)
+        record_benchmark('guide_booking_concurrency', results)
+
+
+class HomepageCacheTests(TestCase):
+    """Homepage payload is cached, invalidated by signals and rebuilt by one worker"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.package = create_package(create_agency(0), 0)
+
+    def test_cached_payload_needs_no_queries(self):
+        self.client.get('/api/homepage/content/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/homepage/content/')
+        self.assertEqual([p['name'] for p in response.data['packages']], ['Package 0'])
+
+    def test_model_changes_invalidate(self):
+        self.client.get('/api/homepage/content/')
+        self.package.name = 'Renamed'
+        self.package.save()
+        response = self.client.get('/api/homepage/content/')
+        self.assertEqual([p['name'] for p in response.data['packages']], ['Renamed'])
+
+        self.package.agency.user.is_approved = False
+        self.package.agency.user.save(update_fields=['is_approved'])
+        self.assertEqual(self.client.get('/api/homepage/content/').data['packages'], [])
+
+    def test_last_login_does_not_invalidate(self):
+        self.client.get('/api/homepage/content/')
+        user = self.package.agency.user
+        user.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            self.client.get('/api/homepage/content/')
+
+    def test_stale_payload_served_while_another_worker_rebuilds(self):
+        self.client.get('/api/homepage/content/')
+        cache.add(f'{HOMEPAGE_CACHE}:rebuild-lock', True, 30)
+        Package.objects.filter(pk=self.package.pk).update(name='Changed')
+        invalidate(HOMEPAGE_CACHE)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/homepage/content/')
+        self.assertEqual([p['name'] for p in response.data['packages']], ['Package 0'])
+
+        cache.delete(f'{HOMEPAGE_CACHE}:rebuild-lock')
+        response = self.client.get('/api/homepage/content/')
+        self.assertEqual([p['name'] for p in response.data['packages']], ['Changed'])
+
+
+class PackageSearchTests(TestCase):
+    """Full-text package search is ranked by field weight and highlights matches"""
+
+    def setUp(self):
+        self.client = APIClient()
+        agency = create_agency(0)
+        self.in_description = Package.objects.create(
+            name='Valley walk', description='A gentle walk ending at the Annapurna viewpoint.',
+            package_type='adventure', agency=agency, duration_days=2, price=Decimal('50.00'),
+        )
+        self.in_name = Package.objects.create(
+            name='Annapurna Base Camp', description='Classic trek.', package_type='adventure',
+            agency=agency, duration_days=10, price=Decimal('900.00'), average_rating=Decimal('1.00'),
+        )
+        self.in_destinations = Package.objects.create(
+            name='Lakeside', description='Boating.', package_type='city', agency=agency,
+            duration_days=1, price=Decimal('20.00'), destinations=['Pokhara', 'Annapurna'],
+        )
+        create_package(agency, 0)
+
+    def test_results_ranked_by_weight(self):
+        response = self.client.get('/api/packages/?q=annapurna')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [str(p.id) for p in (self.in_name, self.in_destinations, self.in_description)],
+        )
+        self.assertIn('<mark>Annapurna</mark>', response.data['results'][2]['headline'])
+        self.assertGreater(response.data['results'][0]['rank'], response.data['results'][2]['rank'])
+
+    def test_search_alias_and_explicit_ordering(self):
+        response = self.client.get('/api/packages/?search=annapurna&ordering=price')
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [str(p.id) for p in (self.in_destinations, self.in_description, self.in_name)],
+        )
+
+    def test_websearch_syntax(self):
+        response = self.client.get('/api/packages/?q=annapurna+-boating')
+        self.assertEqual(response.data['count'], 2)
+
+
+class JSONListFilterTests(TestCase):
+    """List filters compile to jsonb containment instead of whole-list equality"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.guides = [create_guide(i) for i in range(3)]
+        for guide, languages in zip(self.guides, (['English', 'French'], ['French', 'Spanish'], ['Nepali'])):
+            guide.languages = languages
+            guide.save()
+
+    def guide_ids(self, query):
+        response = self.client.get(f'/api/guides/?{query}&ordering=id')
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_guides_all_and_any(self):
+        self.assertEqual(self.guide_ids('languages=French'), [self.guides[0].id, self.guides[1].id])
+        self.assertEqual(self.guide_ids('languages=French,Spanish'), [self.guides[1].id])
+        self.assertEqual(self.guide_ids('languages_any=Spanish,Nepali'), [self.guides[1].id, self.guides[2].id])
+
+    def test_uses_jsonb_operators(self):
+        all_query = str(GuideFilterSet({'languages': 'French'}, queryset=Guide.objects.all()).qs.query)
+        any_query = str(GuideFilterSet({'languages_any': 'French'}, queryset=Guide.objects.all()).qs.query)
+        self.assertIn('@>', all_query)
+        self.assertIn('?|', any_query)
+
+    def test_agency_regions_and_certifications(self):
+        kathmandu = create_agency(0)
+        kathmandu.operating_regions, kathmandu.certifications = ['Kathmandu', 'Pokhara'], ['NTB']
+        kathmandu.save()
+        chitwan = create_agency(1)
+        chitwan.operating_regions = ['Chitwan']
+        chitwan.save()
+
+        response = self.client.get('/api/agencies/?operating_regions_any=Chitwan,Pokhara&ordering=user__created_at')
+        self.assertEqual([item['id'] for item in response.data['results']], [kathmandu.id, chitwan.id])
+        response = self.client.get('/api/agencies/?operating_regions=Kathmandu,Pokhara&certifications=NTB')
+        self.assertEqual([item['id'] for item in response.data['results']], [kathmandu.id])
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages walk (average_rating, id) descending with constant queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        agency = create_agency(0)
+        self.packages = []
+        for i in range(7):
+            package = create_package(agency, i)
+            # Ties on average_rating are broken by id
+            package.average_rating = Decimal('4.50') if i < 3 else Decimal(f'{i % 4}.25')
+            package.package_type = 'adventure' if i % 2 else 'city'
+            package.save()
+            self.packages.append(package)
+        self.expected = [
+            str(p.id) for p in sorted(self.packages, key=lambda p: (p.average_rating, p.id), reverse=True)
+        ]
+
+    def walk(self, url):
+        ids, queries = [], []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids += [item['id'] for item in response.data['results']]
+            queries.append([q['sql'] for q in ctx.captured_queries])
+            url = response.data['next']
+        return ids, queries
+
+    def test_pages_cover_listing_in_order(self):
+        ids, queries = self.walk('/api/packages/?cursor=&page_size=2')
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(len(queries), 4)
+        self.assertEqual(len({len(page) for page in queries}), 1)
+        self.assertFalse(any('COUNT(' in sql for page in queries for sql in page))
+
+    def test_filters_apply_and_page_number_mode_is_unchanged(self):
+        ids, _ = self.walk('/api/packages/?cursor=&page_size=2&package_type=adventure')
+        adventure = {str(p.id) for p in self.packages if p.package_type == 'adventure'}
+        self.assertEqual(ids, [i for i in self.expected if i in adventure])
+        response = self.client.get('/api/packages/?page=2&page_size=5')
+        self.assertEqual(response.data['count'], 7)
+
+    def test_keyset_predicate_bounds_the_index_scan(self):
+        response = self.client.get('/api/packages/?cursor=&page_size=2')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(response.data['next'])
+        sql = ctx.captured_queries[-1]['sql']
+        self.assertIn('"core_package"."average_rating" <= ', sql)
+        self.assertIn('"core_package"."id" < ', sql)
+
+    def test_invalid_cursor_and_unsupported_ordering(self):
+        self.assertEqual(self.client.get('/api/guides/?cursor=not-a-cursor').status_code, 404)
+        self.assertEqual(self.client.get('/api/agencies/?cursor=&ordering=total_bookings').status_code, 400)
+
+
+class AgencyBookingExportTests(TestCase):
+    """Agency bookings are paginated, filterable and streamable"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.agency = create_agency(0)
+        package = create_package(self.agency, 0)
+        tourist = create_tourist(0)
+        self.bookings = []
+        for i in range(25):
+            start = date(2026, 1, 1) + timedelta(days=10 * i)
+            self.bookings.append(Booking.objects.create(
+                tourist=tourist, booking_type='package', package=package,
+                status='cancelled' if i % 5 == 0 else 'confirmed',
+                start_date=start, end_date=start + timedelta(days=2), total_price=Decimal('100.00'),
+            ))
+        other = create_package(create_agency(1), 1)
+        Booking.objects.create(
+            tourist=tourist, booking_type='package', package=other, start_date=date(2026, 1, 1),
+            end_date=date(2026, 1, 2), total_price=Decimal('100.00'),
+        )
+        self.client.force_authenticate(self.agency.user)
+
+    def test_paginated_and_filtered(self):
+        response = self.client.get('/api/agency/manage/bookings/')
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get('/api/agency/manage/bookings/?status=cancelled,pending')
+        self.assertEqual(response.data['count'], 5)
+        # Bookings 1 and 2 (01-11..01-13, 01-21..01-23) overlap the window
+        response = self.client.get('/api/agency/manage/bookings/?date_from=2026-01-09&date_to=2026-01-21')
+        self.assertEqual(
+            {item['id'] for item in response.data['results']},
+            {str(self.bookings[1].id), str(self.bookings[2].id)},
+        )
+        self.assertEqual(self.client.get('/api/agency/manage/bookings/?status=lost').status_code, 400)
+
+    def test_stream_matches_paginated_rows(self):
+        paginated = self.client.get('/api/agency/manage/bookings/?status=confirmed')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/agency/manage/bookings/?status=confirmed&stream=true')
+            streamed = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(len(streamed), 20)
+        self.assertEqual(streamed, json.loads(paginated.content)['results'])
+        self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+
+    def test_stream_reads_in_chunks(self):
+        queryset = Booking.objects.select_related(*views.BOOKING_RELATED).order_by('-created_at', '-id')
+        with CaptureQueriesContext(connection) as ctx:
+            chunks = list(views.stream_json_array(queryset, views.BookingSerializer, chunk_size=4))
+        self.assertEqual(len(json.loads(b''.join(chunks))), 26)
+        # '[' + seven chunks of rows + ']', with no query per row
+        self.assertEqual(len(chunks), 9)
+        self.assertLess(len(ctx.captured_queries), 10)
+
+
+class AgencyBookingOwnershipTests(TestCase):
+    """Booking ownership links follow bookings and managed_guides changes"""
+
+    def setUp(self):
+        self.agencies = [create_agency(i) for i in range(3)]
+        self.guide = create_guide(0)
+        self.tourist = create_tourist(0)
+
+    def book(self, **target):
+        return Booking.objects.create(
+            tourist=self.tourist, booking_type=next(iter(target)), start_date=date(2026, 5, 1),
+            end_date=date(2026, 5, 2), total_price=Decimal('50.00'), **target,
+        )
+
+    def owners(self, booking):
+        return set(AgencyBooking.objects.filter(booking=booking).values_list('agency_id', flat=True))
+
+    def test_links_created_with_booking(self):
+        self.agencies[0].managed_guides.add(self.guide)
+        self.agencies[1].managed_guides.add(self.guide)
+        package_booking = self.book(package=create_package(self.agencies[2], 0))
+        guide_booking = self.book(guide=self.guide)
+        agency_booking = self.book(agency=self.agencies[0])
+        self.assertEqual(self.owners(package_booking), {self.agencies[2].id})
+        self.assertEqual(self.owners(guide_booking), {self.agencies[0].id, self.agencies[1].id})
+        self.assertEqual(self.owners(agency_booking), {self.agencies[0].id})
+
+        guide_booking.guide, guide_booking.agency = None, self.agencies[2]
+        guide_booking.save()
+        self.assertEqual(self.owners(guide_booking), {self.agencies[2].id})
+
+    def test_managed_guides_changes_from_both_sides(self):
+        booking = self.book(guide=self.guide)
+        self.assertEqual(self.owners(booking), set())
+        self.agencies[0].managed_guides.add(self.guide)
+        self.guide.agencies.add(self.agencies[1], self.agencies[2])
+        self.assertEqual(self.owners(booking), {a.id for a in self.agencies})
+
+        self.agencies[0].managed_guides.remove(self.guide)
+        self.assertEqual(self.owners(booking), {self.agencies[1].id, self.agencies[2].id})
+        self.agencies[1].managed_guides.clear()
+        self.assertEqual(self.owners(booking), {self.agencies[2].id})
+        self.guide.agencies.set([self.agencies[0]])
+        self.assertEqual(self.owners(booking), {self.agencies[0].id})
+        self.guide.agencies.clear()
+        self.assertEqual(self.owners(booking), set())
+
+    def test_removing_guide_keeps_links_owned_another_way(self):
+        agency = self.agencies[0]
+        agency.managed_guides.add(self.guide)
+        booking = self.book(guide=self.guide)
+        booking.agency = agency
+        booking.save()
+        agency.managed_guides.remove(self.guide)
+        self.assertEqual(self.owners(booking), {agency.id})
+
+    def test_rebuild_matches_signals(self):
+        self.agencies[0].managed_guides.add(self.guide)
+        self.book(guide=self.guide)
+        self.book(package=create_package(self.agencies[1], 0))
+        self.book(agency=self.agencies[2])
+        before = set(AgencyBooking.objects.values_list('agency_id', 'booking_id', 'created_at'))
+        self.assertEqual(rebuild_agency_booking_links(), 3)
+        self.assertEqual(set(AgencyBooking.objects.values_list('agency_id', 'booking_id', 'created_at')), before)
+
+    def test_listing_reads_links_without_or(self):
+        agency = self.agencies[0]
+        agency.managed_guides.add(self.guide)
+        bookings = [self.book(guide=self.guide), self.book(agency=agency), self.book(agency=self.agencies[1])]
+        client = APIClient()
+        client.force_authenticate(agency.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/api/agency/manage/bookings/')
+        self.assertEqual([item['id'] for item in response.data['results']], [str(b.id) for b in bookings[1::-1]])
+        self.assertFalse(any(' OR ' in q['sql'] for q in ctx.captured_queries))
+
+
+class ValuesSerializerTests(TestCase):
+    """The values() fast path renders exactly what the list serializers do"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_benchmark_data()
+        User.objects.filter(username__in=['bench_agency0', 'bench_guide1']).update(profile_image='profiles/me.png')
+        Agency.objects.filter(company_name='Bench Agency 1').update(website='https://example.com')
+        Package.objects.filter(name='Bench Package 2').update(images=['a.jpg'])
+
+    def setUp(self):
+        self.request = Request(APIRequestFactory().get('/api/packages/'))
+
+    def querysets(self):
+        packages = Package.objects.select_related('agency__user').order_by('id')
+        searched = PackageSearchFilter().filter_queryset(
+            Request(APIRequestFactory().get('/api/packages/?q=hills')), packages, None
+        )
+        return [
+            (serializers.PackageListSerializer, packages),
+            (serializers.PackageSearchSerializer, searched),
+            (serializers.GuideListSerializer, Guide.objects.select_related('user').order_by('id')),
+            (serializers.AgencyListSerializer, Agency.objects.select_related('user').order_by('id')),
+        ]
+
+    def test_byte_identical_output(self):
+        renderer = JSONRenderer()
+        for serializer_class, queryset in self.querysets():
+            with self.subTest(serializer_class.__name__):
+                regular = serializer_class(queryset, many=True, context={'request': self.request}).data
+                fast = get_values_serializer(serializer_class)
+                fast_data = fast.to_representation(fast.values(queryset), self.request)
+                self.assertTrue(regular)
+                self.assertEqual(renderer.render(fast_data), renderer.render(regular))
+
+    def test_rows_per_second(self):
+        results = {}
+        for serializer_class, queryset in self.querysets():
+            fast = get_values_serializer(serializer_class)
+            rates = {}
+            for label, serialize in (
+                ('serializer', lambda: serializer_class(queryset.all(), many=True).data),
+                ('values', lambda: fast.to_representation(fast.values(queryset.all()))),
+            ):
+                timings, rows = [], 0
+                for _ in range(5):
+                    started = time.perf_counter()
+                    rows = len(serialize())
+                    timings.append(time.perf_counter() - started)
+                rates[label] = round(rows / statistics.median(timings))
+            results[serializer_class.__name__] = {'rows_per_second': rates}
+            # Wall-clock comparisons are only reliable on a quiet machine, so they are opt-in
+            if os.environ.get('BENCHMARK_COMPARE_SPEED'):
+                self.assertGreater(rates['values'], rates['serializer'], serializer_class.__name__)
+        record_benchmark('serializers', results)
+
+
+class ConditionalGetTests(TestCase):
+    """Public list and detail endpoints answer revalidation with 304"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.agency = create_agency(0)
+        self.package = create_package(self.agency, 0)
+        self.guide = create_guide(0)
+
+    def revalidate(self, url, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, **headers)
+        return response, ctx.captured_queries
+
+    def assertRevalidates(self, url, change, queries=1):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response, captured = self.revalidate(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Lists count their rows, then read the page's validators
+        self.assertEqual(len(captured), queries)
+        response, _ = self.revalidate(url, HTTP_IF_MODIFIED_SINCE=self.client.get(url)['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_package_list_and_detail(self):
+        def rename_agency():
+            self.agency.company_name = 'Renamed'
+            self.agency.save()
+        self.assertRevalidates('/api/packages/', rename_agency, queries=2)
+        self.assertRevalidates(f'/api/packages/{self.package.id}/', lambda: Rating.objects.create(
+            tourist=create_tourist(0), rating_type='package', package=self.package, rating=3,
+        ))
+
+    def test_list_etag_covers_deletes_and_query(self):
+        create_package(self.agency, 1)
+        self.assertRevalidates('/api/packages/', lambda: self.package.delete(), queries=2)
+        first = self.client.get('/api/packages/')['ETag']
+        self.assertNotEqual(self.client.get('/api/packages/?package_type=city')['ETag'], first)
+
+    def test_guide_and_agency(self):
+        def update_user():
+            self.guide.user.first_name = 'Changed'
+            self.guide.user.save()
+        self.assertRevalidates(f'/api/guides/{self.guide.id}/', update_user)
+        self.assertRevalidates(f'/api/agencies/{self.agency.id}/', lambda: self.agency.managed_guides.add(self.guide))
+        self.assertRevalidates('/api/agencies/', lambda: create_agency(1), queries=2)
+
+    def test_list_validators_cover_only_the_page(self):
+        for index in range(1, 4):
+            create_package(self.agency, index)
+        url = '/api/packages/?page_size=2&page=2'
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        queries = [q['sql'] for q in ctx.captured_queries]
+        validators = [sql for sql in queries if 'MAX(' in sql]
+        self.assertEqual(len(validators), 1)
+        self.assertIn('LIMIT 2 OFFSET 2', validators[0])
+        # Read before the rows, so a concurrent write cannot give an old body a new ETag
+        self.assertLess(queries.index(validators[0]), queries.index(queries[-1]))
+        self.assertNotIn('MAX(', queries[-1])
+        self.assertFalse([q for q in ctx.captured_queries if 'COUNT("core_package"."id")' in q['sql']])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # Rows moving onto the page change its ETag even when none of them was updated
+        Package.objects.filter(pk=self.package.pk).delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertEqual(self.client.get('/api/packages/?page=9', HTTP_IF_NONE_MATCH='"x"').status_code, 404)
+
+    def test_missing_and_malformed_detail(self):
+        self.assertEqual(self.client.get('/api/packages/not-a-uuid/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/agencies/{self.agency.id + 100}/').status_code, 404)
+
+
+class DynamicFieldsTests(TestCase):
+    """?fields= and ?expand= shape the response and the query behind it"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.agency = create_agency(0)
+        self.package = create_package(self.agency, 0)
+        self.guides = [create_guide(i) for i in range(2)]
+        self.agency.managed_guides.add(*self.guides)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data, [q['sql'] for q in ctx.captured_queries]
+
+    def test_sparse_list_loads_only_requested_columns(self):
+        data, queries = self.get('/api/packages/?fields=id,name,agency.company_name')
+        self.assertEqual(data['results'], [
+            {'id': str(self.package.id), 'name': 'Package 0', 'agency': {'company_name': 'Agency 0'}},
+        ])
+        rows = [sql for sql in queries if 'MAX(' not in sql][-1]
+        self.assertIn('"core_agency"."company_name"', rows)
+        self.assertNotIn('"core_package"."description"', rows)
+        self.assertNotIn('"core_user"."username"', rows)
+
+    def test_sparse_detail_skips_unrequested_relations(self):
+        data, queries = self.get(f'/api/agencies/{self.agency.id}/?fields=id,company_name')
+        self.assertEqual(data, {'id': self.agency.id, 'company_name': 'Agency 0'})
+        self.assertFalse(any('managed_guides' in sql for sql in queries[1:]))
+
+    def test_expand_is_opt_in_and_prefetched(self):
+        data, _ = self.get('/api/agencies/')
+        self.assertNotIn('managed_guides', data['results'][0])
+
+        url = '/api/agencies/?expand=managed_guides&fields=id,managed_guides.id,managed_guides.user.username'
+        data, queries = self.get(url)
+        self.assertEqual(
+            data['results'][0]['managed_guides'],
+            [{'id': g.id, 'user': {'username': g.user.username}} for g in self.guides],
+        )
+        self.agency.managed_guides.add(*[create_guide(i) for i in range(2, 6)])
+        self.assertEqual(len(self.get(url)[1]), len(queries))
+
+    def test_expand_hides_unlisted_profiles(self):
+        hidden = create_agency(1, approved=False)
+        hidden.managed_guides.add(self.guides[0])
+        User.objects.filter(pk=self.guides[1].user_id).update(is_active=False)
+
+        data, _ = self.get(f'/api/guides/{self.guides[0].id}/?expand=agencies')
+        self.assertEqual([agency['id'] for agency in data['agencies']], [self.agency.id])
+        data, _ = self.get(f'/api/agencies/{self.agency.id}/?expand=managed_guides')
+        self.assertEqual([guide['id'] for guide in data['managed_guides']], [self.guides[0].id])
+
+    def test_dotted_expand_through_nested_serializer(self):
+        url = '/api/packages/?fields=id,agency.id&expand=agency.managed_guides'
+        data, queries = self.get(url)
+        agency = data['results'][0]['agency']
+        self.assertEqual(set(agency), {'id', 'managed_guides'})
+        self.assertEqual(len(agency['managed_guides']), 2)
+        self.agency.managed_guides.add(create_guide(3))
+        self.assertEqual(len(self.get(url)[1]), len(queries))
+
+    def test_tourist_bookings_and_writes_ignore_spec(self):
+        tourist = create_tourist(0)
+        Booking.objects.create(
+            tourist=tourist, booking_type='package', package=self.package, start_date=date(2026, 6, 1),
+            end_date=date(2026, 6, 2), total_price=Decimal('100.00'),
+        )
+        self.client.force_authenticate(tourist.user)
+        data, _ = self.get('/api/tourist/bookings/?fields=status,package.name')
+        self.assertEqual(data['results'], [{'status': 'pending', 'package': {'name': 'Package 0'}}])
+
+        response = self.client.post('/api/tourist/bookings/?fields=id', {
+            'booking_type': 'package', 'package': str(self.package.id),
+            'start_date': '2026-07-01', 'end_date': '2026-07-02',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertIn('start_date', response.data)
+
+
+class ClaimsAuthenticationTests(TestCase):
+    """Access tokens with a current auth version authenticate without loading the user"""
+
+    def setUp(self):
+        cache.clear()
+        authentication._local_versions.clear()
+        self.tourist = create_tourist(0)
+        self.user = self.tourist.user
+        self.client = APIClient()
+
+    def get(self, token, url='/api/tourist/bookings/'):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in ctx.captured_queries]
+
+    def user_queries(self, queries):
+        return [sql for sql in queries if 'FROM "core_user"' in sql]
+
+    def test_claims_user_after_first_request(self):
+        token = _tokens(self.user)['access']
+        response, queries = self.get(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.user_queries(queries)), 1)
+        response, queries = self.get(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.user_queries(queries), [])
+
+    def test_deferred_fields_load_together(self):
+        remember_auth_version(self.user.pk, self.user.auth_version)
+        auth = ClaimsJWTAuthentication()
+        user = auth.get_user(auth.get_validated_token(_tokens(self.user)['access']))
+        self.assertEqual((user.pk, user.user_type, user.is_approved), (self.user.pk, 'tourist', True))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(
+                (user.first_name, user.last_name, user.phone_number, user.date_joined),
+                (self.user.first_name, self.user.last_name, self.user.phone_number, self.user.date_joined),
+            )
+        self.assertEqual(len(ctx.captured_queries), 1)
+        response, _ = self.get(_tokens(self.user)['access'], '/api/auth/profile/')
+        self.assertEqual(response.data['email'], self.user.email)
+
+    def test_claim_change_outdates_tokens(self):
+        token = _tokens(self.user)['access']
+        self.get(token)
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertEqual(self.user_queries(self.get(token)[1]), [])
+
+        self.user.user_type = 'agency'
+        self.user.save(update_fields=['user_type'])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.auth_version, 1)
+        response, queries = self.get(token)
+        self.assertEqual(len(self.user_queries(queries)), 1)
+        self.assertEqual(response.data['count'], 0)
+
+        fresh = _tokens(self.user)['access']
+        self.get(fresh)
+        self.assertEqual(self.user_queries(self.get(fresh)[1]), [])
+
+    def test_deactivated_and_legacy_tokens(self):
+        legacy = str(RefreshToken.for_user(self.user).access_token)
+        self.get(legacy)
+        self.assertEqual(len(self.user_queries(self.get(legacy)[1])), 1)
+
+        token = _tokens(self.user)['access']
+        self.get(token)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get(token)[0].status_code, 401)
+
+    def test_process_local_cache_keeps_versions_briefly(self):
+        self.assertEqual(shared_version_ttl(), AUTH_VERSION_LOCAL_TTL)
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}):
+            self.assertEqual(shared_version_ttl(), AUTH_VERSION_SHARED_TTL)
+
+
+class TokenRevocationTests(TestCase):
+    """Logout revokes the refresh token; refresh checks revocation by jti"""
+
+    def setUp(self):
+        cache.clear()
+        revocation._local_revoked.clear()
+        self.user = create_tourist(0).user
+        self.client = APIClient()
+
+    def logout(self, refresh):
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/auth/logout/', {'refresh': refresh}, format='json')
+
+    def test_logout_revokes_refresh_token(self):
+        refresh = _tokens(self.user)['refresh']
+        response = self.logout(refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(RevokedToken.objects.filter(user_id=self.user.pk).exists())
+
+        response = self.client.post('/api/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.logout('not-a-token').status_code, 400)
+
+    def test_logout_of_deleted_user(self):
+        ghost = create_tourist(1).user
+        refresh, ghost_id = _tokens(ghost)['refresh'], ghost.pk
+        ghost.delete()
+        self.assertEqual(self.logout(refresh).status_code, 200)
+        connection.check_constraints(table_names=[RevokedToken._meta.db_table])
+        self.assertTrue(RevokedToken.objects.filter(user_id=ghost_id).exists())
+
+    def test_revocation_survives_cache_loss(self):
+        refresh = _tokens(self.user)['refresh']
+        self.logout(refresh)
+        cache.clear()
+        revocation._local_revoked.clear()
+        self.assertTrue(revocation.is_token_revoked(RefreshToken(refresh)))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(revocation.is_token_revoked(RefreshToken(refresh)))
+        other = RefreshToken(_tokens(self.user)['refresh'])
+        self.assertFalse(revocation.is_token_revoked(other))
+        # Other processes could not replace a "not revoked" answer in a process-local cache
+        with self.assertNumQueries(1):
+            self.assertFalse(revocation.is_token_revoked(other))
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}):
+            self.assertFalse(revocation.is_token_revoked(other))
+            with self.assertNumQueries(0):
+                self.assertFalse(revocation.is_token_revoked(other))
+
+    def test_refresh_issues_current_claims(self):
+        refresh = _tokens(self.user)['refresh']
+        self.user.email = 'renamed@example.com'
+        self.user.save()
+        response = self.client.post('/api/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        access = AccessToken(response.data['access'])
+        self.assertEqual((access['email'], access[VERSION_CLAIM]), ('renamed@example.com', 1))
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.post('/api/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_purge_expired_revocations(self):
+        RevokedToken.objects.create(jti='expired', user_id=self.user.pk, expires_at=timezone.now() - timedelta(days=1))
+        RevokedToken.objects.create(jti='current', user_id=self.user.pk, expires_at=timezone.now() + timedelta(days=1))
+        out = StringIO()
+        call_command('purge_revoked_tokens', stdout=out)
+        self.assertIn('Purged 1', out.getvalue())
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['current'])
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    """
+    Answers like the OAuth providers' profile endpoints and the Graph API's
+    debug_token, and serves ``images`` by path; token 'slow' hangs, and every
+    call waits ``delay`` seconds. ``max_in_flight`` records the most calls
+    that were being answered at once.
+    """
+    profiles = {
+        'google-token': {
+            'id': '7', 'email': 'stub.google@example.com', 'name': 'Stub Google',
+            'given_name': 'Stub', 'family_name': 'Google',
+        },
+        'google-namesake': {'id': '8', 'email': 'stub.google@example.org', 'name': 'Stub Google'},
+        'facebook-token': {
+            'id': '42', 'email': 'stub.facebook@example.com', 'name': 'Stub Facebook',
+            'first_name': 'Stub', 'last_name': 'Facebook',
+        },
+    }
+    images = {}
+    delay = 0
+    paths = []
+    in_flight = max_in_flight = 0
+    in_flight_lock = Lock()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.paths.append(url.path)
+        with self.in_flight_lock:
+            StubProviderHandler.in_flight += 1
+            StubProviderHandler.max_in_flight = max(StubProviderHandler.max_in_flight, StubProviderHandler.in_flight)
+        try:
+            time.sleep(self.delay)
+        finally:
+            with self.in_flight_lock:
+                StubProviderHandler.in_flight -= 1
+        if url.path.startswith('/images/'):
+            image = self.images.get(url.path)
+            return self.respond(200 if image else 404, image or b'', 'image/png')
+        if url.path == '/debug_token':
+            profile = {'data': {'is_valid': query['input_token'][0] in self.profiles}}
+        else:
+            token = query.get('access_token', [self.headers.get('Authorization', '').removeprefix('Bearer ')])[0]
+            if token == 'slow':
+                time.sleep(1)
+            profile = self.profiles.get(token)
+        body = json.dumps(profile or {'error': {'message': 'invalid token'}}).encode()
+        self.respond(200 if profile else 401, body, 'application/json')
+
+    def respond(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client timed out first
+
+    def log_message(self, *args):
+        pass
+
+
+class StubProviderTestCase(TestCase):
+    """Points the OAuth provider settings at a local StubProviderHandler server"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubProviderHandler)
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        base = f'http://127.0.0.1:{cls.server.server_port}'
+        cls.base_url = base
+        cls.provider_settings = override_settings(
+            GOOGLE_USERINFO_URL=f'{base}/userinfo', FACEBOOK_GRAPH_URL=base, OAUTH_HTTP_TIMEOUT=0.3,
+        )
+        cls.provider_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.provider_settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+
+class AsyncSocialLoginTests(StubProviderTestCase):
+    """Social logins call a local stub provider through the shared async client"""
+
+    async def login(self, provider, token):
+        try:
+            return await AsyncClient().post(
+                f'/api/auth/{provider}_login/', {'access_token': token}, content_type='application/json',
+            )
+        finally:
+            await close_client()
+
+    async def test_google_login_registers_then_logs_in(self):
+        response = await self.login('google', 'google-token')
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual((data['user']['email'], data['user']['first_name']), ('stub.google@example.com', 'Stub'))
+        self.assertIn('access', data)
+
+        response = await self.login('google', 'google-token')
+        self.assertEqual((response.status_code, response.json()['created']), (200, False))
+
+    async def test_namesakes_get_distinct_usernames(self):
+        first = (await self.login('google', 'google-token')).json()['user']
+        second = await self.login('google', 'google-namesake')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual((first['username'], second.json()['user']['username']), ('stub_google', 'stub_google_1'))
+        user = await User.objects.aget(email='stub.google@example.com')
+        self.assertEqual((user.google_id, user.provider), ('7', 'google'))
+
+    async def test_facebook_login(self):
+        response = await self.login('facebook', 'facebook-token')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['user']['last_name'], 'Facebook')
+        self.assertEqual((await self.login('facebook', 'bogus')).status_code, 400)
+
+    async def test_provider_errors(self):
+        self.assertEqual((await self.login('google', '')).status_code, 400)
+        self.assertEqual((await self.login('google', 'bogus')).status_code, 400)
+        response = await self.login('google', 'slow')
+        self.assertEqual(response.status_code, 504)
+        with override_settings(GOOGLE_USERINFO_URL='http://127.0.0.1:9/userinfo'):
+            self.assertEqual((await self.login('google', 'google-token')).status_code, 502)
+
+    def test_client_is_shared_across_event_loops(self):
+        async def current_client():
+            async def read():
+                return get_client()
+            return await run_on_provider_loop(read())
+
+        # Under WSGI every request runs its async view on a new event loop
+        client = asyncio.run(current_client())
+        self.assertIs(asyncio.run(current_client()), client)
+        asyncio.run(close_client())
+        self.assertTrue(client.is_closed)
+        self.assertIsNot(asyncio.run(current_client()), client)
+        asyncio.run(close_client())
+
+
+class FacebookTokenVerificationTests(StubProviderTestCase):
+    """FacebookOAuth checks the token and reads the profile concurrently, then caches the result"""
+
+    def setUp(self):
+        cache.clear()
+        StubProviderHandler.paths = []
+        self.addCleanup(setattr, StubProviderHandler, 'delay', 0)
+
+    def test_graph_calls_run_concurrently_and_are_cached(self):
+        StubProviderHandler.delay = 0.2
+        StubProviderHandler.max_in_flight = 0
+        data = FacebookOAuth.verify_facebook_token('facebook-token')
+        self.assertEqual((data['facebook_id'], data['email']), ('42', 'stub.facebook@example.com'))
+        self.assertEqual(sorted(StubProviderHandler.paths), ['/debug_token', '/me'])
+        self.assertEqual(StubProviderHandler.max_in_flight, 2)
+
+        self.assertEqual(FacebookOAuth.verify_facebook_token('facebook-token'), data)
+        self.assertEqual(len(StubProviderHandler.paths), 2)
+        self.assertNotIn('facebook-token', FacebookOAuth.cache_key('facebook-token'))
+
+    def test_invalid_tokens_are_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(ValidationError):
+                FacebookOAuth.verify_facebook_token('bogus')
+        self.assertEqual(len(StubProviderHandler.paths), 4)
+
+
+class UsernameAllocationTests(TestCase):
+    """Social sign-up picks the lowest free base_<n> username in one query"""
+
+    def allocate(self, name, email='someone@example.com'):
+        with CaptureQueriesContext(connection) as ctx:
+            username = SocialAuthUtils.generate_unique_username(name, email)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        return username
+
+    def test_lowest_free_counter(self):
+        self.assertEqual(self.allocate('John Smith'), 'john_smith')
+        for username in ('john_smith', 'john_smith_1', 'john_smith_3', 'john_smith_jr', 'john_smithers', 'j.smith'):
+            User.objects.create_user(username=username, email=f'{username}@example.com')
+        self.assertEqual(self.allocate('John Smith'), 'john_smith_2')
+        self.assertEqual(self.allocate('', 'j.smith@example.com'), 'j.smith_1')
+        self.assertEqual(self.allocate('', 'jxsmith@example.com'), 'jxsmith')
+
+    def test_concurrent_sign_up_retries(self):
+        User.objects.create_user(username='taken', email='taken@example.com')
+        with mock.patch.object(SocialAuthUtils, 'generate_unique_username', side_effect=['taken', 'taken_1']):
+            user, created = SocialAuthUtils.get_or_create_user_from_social_data(
+                {'google_id': 'g-2', 'email': 'new@example.com', 'name': 'Taken'}, 'google',
+            )
+        self.assertEqual((user.username, created), ('taken_1', True))
+
+    def test_concurrent_sign_up_with_same_email_logs_in(self):
+        data = {'google_id': 'g-3', 'email': 'racer@example.com', 'name': 'Racer'}
+
+        def lose_race(name, email):
+            # The same person's other request commits its sign-up first
+            User.objects.create_user(username='racer_first', email=email, google_id='g-3')
+            return 'racer'
+        with mock.patch.object(SocialAuthUtils, 'generate_unique_username', side_effect=lose_race):
+            user, created = SocialAuthUtils.get_or_create_user_from_social_data(data, 'google')
+        self.assertEqual((user.username, created), ('racer_first', False))
+        self.assertEqual(User.objects.filter(email='racer@example.com').count(), 1)
+
+    def test_allocation_benchmark(self):
+        scale = int(os.environ.get('BENCHMARK_SCALE', 1))
+        common = 1000 * scale
+        User.objects.bulk_create(
+            [User(username='john_smith', email='john_smith@example.com')]
+            + [User(username=f'john_smith_{i}', email=f'john_smith_{i}@example.com') for i in range(1, common + 1)]
+            + [User(username=f'user_{i}', email=f'user_{i}@example.com') for i in range(20 * common)],
+            batch_size=5000,
+        )
+        started = time.perf_counter()
+        self.assertEqual(self.allocate('John Smith'), f'john_smith_{common + 1}')
+        record_benchmark('username_allocation', {
+            'users': User.objects.count(), 'taken_suffixes': common,
+            'time_ms': round((time.perf_counter() - started) * 1000, 2),
+        })
+
+
+class MediaJobTests(StubProviderTestCase):
+    """Social login profile images are fetched by the media job worker"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        image = BytesIO()
+        Image.new('RGB', (640, 480), 'teal').save(image, 'PNG')
+        StubProviderHandler.images = {'/images/avatar.png': image.getvalue()}
+        StubProviderHandler.paths = []
+
+    def social_login(self, image_path):
+        return SocialAuthUtils.get_or_create_user_from_social_data({
+            'google_id': 'g-1', 'email': 'social@example.com', 'name': 'Social User',
+            'profile_image': f'{self.base_url}{image_path}',
+        }, 'google')
+
+    def test_login_queues_image_and_worker_resizes_it(self):
+        user, created = self.social_login('/images/avatar.png')
+        self.assertTrue(created)
+        self.assertEqual(StubProviderHandler.paths, [])
+        self.assertEqual(user.media_jobs.get().status, 'pending')
+
+        out = StringIO()
+        call_command('process_media_jobs', once=True, stdout=out)
+        self.assertIn('Processed 1', out.getvalue())
+        user.refresh_from_db()
+        self.assertEqual(user.media_jobs.get().status, 'done')
+        self.assertEqual(user.profile_image.name, avatar_name(user, AVATAR_SIZES[0]))
+        for size in AVATAR_SIZES:
+            with user.profile_image.storage.open(avatar_name(user, size)) as file, Image.open(file) as image:
+                self.assertEqual(image.size, (size, size))
+
+    def test_upload_during_download_is_kept(self):
+        user, _ = self.social_login('/images/avatar.png')
+        job, = claim_jobs(1)
+        avatars, error = fetch_avatars(job)
+        User.objects.filter(pk=user.pk).update(profile_image='profiles/own.jpg')
+        finish_job(job, avatars, error)
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(User.objects.get(pk=user.pk).profile_image.name, 'profiles/own.jpg')
+
+    def test_failed_downloads_retry_with_backoff(self):
+        user, _ = self.social_login('/images/missing.png')
+        job = user.media_jobs.get()
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            before = timezone.now()
+            self.assertEqual(process_media_jobs(), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.attempts, attempt)
+            if attempt < MAX_ATTEMPTS:
+                self.assertEqual(job.status, 'pending')
+                self.assertGreaterEqual(job.run_after, before + timedelta(seconds=RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+                self.assertEqual(process_media_jobs(), 0)
+                MediaJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('404', job.last_error)
+        self.assertFalse(User.objects.get(pk=user.pk).profile_image)
+
+
+def _google_signing_key(key_id):
+    """A locally generated RSA key and self-signed certificate standing in for one of Google's"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, key_id)])
+    now = timezone.now()
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number()).not_valid_before(now).not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    pem_key = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption(),
+    )
+    return crypt.RSASigner.from_string(pem_key, key_id=key_id), cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+class StubCertsTransport:
+    """google.auth transport serving certificates from memory and counting fetches"""
+
+    def __init__(self, certs, max_age=3600):
+        self.certs, self.max_age, self.fetches = certs, max_age, 0
+
+    def __call__(self, url, method='GET', **kwargs):
+        self.fetches += 1
+        return SimpleNamespace(
+            status=200, headers={'Cache-Control': f'public, max-age={self.max_age}'},
+            data=json.dumps(self.certs).encode(),
+        )
+
+
+@override_settings(GOOGLE_OAUTH2_CLIENT_ID='client-id')
+class GoogleTokenVerificationTests(TestCase):
+    """Google ID tokens verify against cached signing certificates"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.signer, cls.cert = _google_signing_key('key-1')
+        cls.rotated_signer, cls.rotated_cert = _google_signing_key('key-2')
+
+    def setUp(self):
+        self.transport = StubCertsTransport({'key-1': self.cert})
+        self.certs = oauth_utils.GoogleCertCache(self.transport)
+        patcher = mock.patch.object(oauth_utils, 'google_certs', self.certs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def id_token(self, signer=None, **claims):
+        now = int(time.time())
+        payload = {
+            'iss': 'https://accounts.google.com', 'aud': 'client-id', 'sub': '1234', 'iat': now, 'exp': now + 3600,
+            'email': 'someone@example.com', 'given_name': 'Some', 'family_name': 'One', 'email_verified': True,
+        }
+        payload.update(claims)
+        return jwt.encode(signer or self.signer, payload).decode()
+
+    def verify(self, token):
+        return GoogleOAuth.verify_google_token(token)
+
+    def test_certificates_fetched_once_until_max_age(self):
+        data = self.verify(self.id_token())
+        self.assertEqual((data['google_id'], data['email'], data['first_name']), ('1234', 'someone@example.com', 'Some'))
+        for _ in range(5):
+            self.verify(self.id_token())
+        self.assertEqual(self.transport.fetches, 1)
+        with self.assertRaises(ValidationError):
+            self.verify(self.id_token(aud='someone-else'))
+        with self.assertRaises(ValidationError):
+            self.verify(self.id_token(iss='https://evil.example.com'))
+
+        self.certs.expires_at = time.monotonic()
+        self.verify(self.id_token())
+        self.assertEqual(self.transport.fetches, 2)
+
+    def test_rotated_key_refetches_certificates(self):
+        self.verify(self.id_token())
+        self.transport.certs = {'key-1': self.cert, 'key-2': self.rotated_cert}
+        self.certs.fetched_at -= 60
+        self.assertEqual(self.verify(self.id_token(self.rotated_signer))['google_id'], '1234')
+        self.assertEqual(self.transport.fetches, 2)
+
+    def test_verification_benchmark(self):
+        repeat = int(os.environ.get('BENCHMARK_REPEAT', 5)) * 10
+        tokens = [self.id_token(sub=str(i)) for i in range(repeat)]
+
+        def per_token_ms(fresh_cache):
+            started = time.perf_counter()
+            for token in tokens:
+                if fresh_cache:
+                    oauth_utils.google_certs = oauth_utils.GoogleCertCache(self.transport)
+                self.verify(token)
+            return round((time.perf_counter() - started) * 1000 / len(tokens), 3)
+
+        cold = per_token_ms(True)
+        oauth_utils.google_certs, fetches = oauth_utils.GoogleCertCache(self.transport), self.transport.fetches
+        warm = per_token_ms(False)
+        self.assertEqual(self.transport.fetches, fetches + 1)
+        record_benchmark('google_token_verification', {'uncached_ms': cold, 'cached_ms': warm})
+
+
+class SeedCommandTests(TestCase):
+    """manage.py seed writes a reproducible, consistent dataset"""
+
+    def seed(self, **options):
+        out = StringIO()
+        call_command('seed', scale=0.02, stdout=out, **options)
+        return out.getvalue()
+
+    def fingerprint(self):
+        return (
+            list(User.objects.order_by('username').values_list('id', 'first_name', 'created_at')),
+            list(Booking.objects.order_by('id').values_list('id', 'tourist__user__username', 'start_date', 'total_price')),
+            list(Rating.objects.order_by('id').values_list('id', 'rating')),
+        )
+
+    def test_seed_counts_and_derived_tables(self):
+        self.assertIn('Seeded 20 tourists, 4 guides, 1 agencies, 10 packages, 100 bookings, 60 ratings', self.seed())
+        self.assertEqual(
+            (Tourist.objects.count(), Guide.objects.count(), Agency.objects.count(), Booking.objects.count()),
+            (20, 4, 1, 100),
+        )
+        self.assertEqual(Rating.objects.values('tourist', 'package', 'guide', 'agency').distinct().count(), 60)
+        self.assertGreater(User.objects.values('created_at').distinct().count(), 1)
+
+        # Derived tables match what the signals would have written
+        self.assertEqual(AgencyBooking.objects.count(), rebuild_agency_booking_links())
+        rated = Package.objects.filter(rating_count__gt=0).first()
+        self.assertEqual(rated.rating_count, rated.ratings.count())
+
+        for guide in Guide.objects.all():
+            ends = None
+            for start, end in guide.bookings.order_by('start_date').values_list('start_date', 'end_date'):
+                self.assertTrue(ends is None or start > ends)
+                ends = end
+
+    def test_same_seed_same_data(self):
+        self.seed(seed=3)
+        first = self.fingerprint()
+        self.seed(seed=3, clear=True)
+        self.assertEqual(self.fingerprint(), first)
+        self.seed(seed=4, clear=True)
+        self.assertNotEqual(self.fingerprint()[1], first[1])
+
+    def test_rerun_without_clear_is_refused(self):
+        self.seed()
+        with self.assertRaisesMessage(CommandError, 'pass --clear'):
+            self.seed(seed=1)
+
+    def test_rebuild_invalidates_homepage(self):
+        with mock.patch('core.cache.invalidate') as invalidate, self.captureOnCommitCallbacks(execute=True):
+            self.seed()
+        invalidate.assert_called_with(HOMEPAGE_CACHE)
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Admin changelist pages cost the same number of queries whatever their size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Seeder(scale=0, counts={
+            'tourists': 30, 'guides': 12, 'agencies': 6, 'packages': 30, 'bookings': 60, 'ratings': 60,
+        }).run()
+        Agency.objects.filter(pk=Agency.objects.order_by('pk')[0].pk).update(company_name=None)
+        cls.admin = User.objects.create_user(
+            username='changelist_admin', email='changelist_admin@example.com', is_staff=True, is_superuser=True,
+        )
+
+    def changelist_queries(self, model, per_page):
+        self.client.force_login(self.admin)
+        url = f'/admin/core/{model._meta.model_name}/'
+        with mock.patch.object(admin.site._registry[model], 'list_per_page', per_page):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_constant_queries_per_page(self):
+        for model in (User, Tourist, Guide, Agency, Package, Booking, Rating):
+            with self.subTest(model=model.__name__):
+                small, _ = self.changelist_queries(model, 2)
+                large, response = self.changelist_queries(model, 100)
+                self.assertEqual(large, small)
+                self.assertGreater(len(response.context['cl'].result_list), 2)
+
+    def test_annotated_columns(self):
+        _, response = self.changelist_queries(Booking, 100)
+        for booking in response.context['cl'].result_list:
+            if booking.booking_type == 'guide':
+                user = booking.guide.user
+                self.assertEqual(booking.service_name, f'{user.first_name} {user.last_name}')
+            elif booking.booking_type == 'package':
+                self.assertEqual(booking.service_name, booking.package.name)
+            self.assertEqual(booking.tourist_name, booking.tourist.user.get_full_name())
+        # Annotated columns sort in the database
+        self.assertEqual(self.client.get('/admin/core/booking/?o=2.4').status_code, 200)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    """Large tables are counted from planner estimates, small ones exactly"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Seeder(scale=0, counts={
+            'tourists': 20, 'guides': 4, 'agencies': 2, 'packages': 10, 'bookings': 200, 'ratings': 0,
+        }).run()
+
+    def count(self, queryset):
+        with CaptureQueriesContext(connection) as ctx:
+            count = EstimatedCountPaginator(queryset, 20).count
+        return count, [q['sql'] for q in ctx.captured_queries]
+
+    def test_small_tables_are_counted_exactly(self):
+        count, queries = self.count(Booking.objects.filter(status='completed').order_by('-created_at'))
+        self.assertEqual(count, Booking.objects.filter(status='completed').count())
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.count(Booking.objects.none())[0], 0)
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=50)
+    def test_large_tables_use_planner_estimates(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_booking')
+        count, queries = self.count(Booking.objects.order_by('pk'))
+        self.assertEqual((count, len(queries)), (200, 1))
+
+        cancelled = Booking.objects.exclude(status='cancelled').order_by('pk')
+        count, queries = self.count(cancelled)
+        self.assertAlmostEqual(count, cancelled.count(), delta=20)
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(queries[1].startswith('EXPLAIN'))
+
+        # A selective filter estimated under the threshold is counted exactly
+        count, queries = self.count(Booking.objects.filter(status='in_progress', number_of_people=1).order_by('pk'))
+        self.assertEqual(count, Booking.objects.filter(status='in_progress', number_of_people=1).count())
+        self.assertEqual(len(queries), 3)
+
+
+class AgencyBatchDecisionTests(TestCase):
+    """Bulk approvals and rejections write core_user once per batch"""
+
+    def setUp(self):
+        cache.clear()
+        authentication._local_versions.clear()
+        self.pending = [create_agency(index, approved=False) for index in range(3)]
+        self.approved = create_agency(3)
+        Agency.objects.filter(pk=self.pending[2].pk).update(city='Pokhara')
+        admin = User.objects.create_user(username='batch_admin', email='batch_admin@example.com', user_type='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def post(self, url, payload):
+        with mock.patch('core.cache.invalidate') as invalidate:
+            with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, payload, format='json')
+        return response, [q['sql'] for q in ctx.captured_queries], invalidate
+
+    def test_approve_by_ids(self):
+        ids = [self.pending[0].id, self.pending[1].id, self.approved.id, 999999]
+        response, queries, invalidate = self.post('/api/admin/approve_agencies/', {'agency_ids': ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'agency_id': ids[0], 'outcome': 'approved'},
+            {'agency_id': ids[1], 'outcome': 'approved'},
+            {'agency_id': ids[2], 'outcome': 'unchanged'},
+            {'agency_id': ids[3], 'outcome': 'not_found'},
+        ])
+        self.assertEqual(response.data['summary'], {'approved': 2, 'unchanged': 1, 'not_found': 1})
+        self.assertEqual(len([sql for sql in queries if sql.startswith('UPDATE "core_user"')]), 1)
+        # Once now and once on commit for the whole batch
+        self.assertEqual(invalidate.call_count, 2)
+        for agency in self.pending[:2]:
+            agency.user.refresh_from_db()
+            self.assertEqual((agency.user.is_approved, agency.user.is_verified, agency.user.auth_version),
+                             (True, True, 1))
+        self.pending[2].user.refresh_from_db()
+        self.assertFalse(self.pending[2].user.is_approved)
+
+        response, queries, invalidate = self.post('/api/admin/approve_agencies/', {'agency_ids': ids[:2]})
+        self.assertEqual(response.data['summary'], {'unchanged': 2})
+        self.assertFalse([sql for sql in queries if sql.startswith('UPDATE')])
+        invalidate.assert_not_called()
+
+    def test_reject_by_filter(self):
+        response, _, _ = self.post('/api/admin/reject_agencies/', {'filter': {'city': 'Pokhara'}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [{'agency_id': self.pending[2].id, 'outcome': 'rejected'}])
+        self.assertEqual(
+            list(User.objects.filter(user_type='agency', is_active=False).values_list('pk', flat=True)),
+            [self.pending[2].user_id],
+        )
+
+    def test_outdates_access_tokens(self):
+        user = self.pending[0].user
+        token = _tokens(user)['access']
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(client.get('/api/auth/profile/').status_code, 200)
+        self.post('/api/admin/reject_agencies/', {'agency_ids': [self.pending[0].id]})
+        self.assertEqual(client.get('/api/auth/profile/').status_code, 401)
+
+    def test_invalid_batches(self):
+        for payload in (
+            {},
+            {'agency_ids': [1], 'filter': {'city': 'Pokhara'}},
+            {'agency_ids': []},
+            {'agency_ids': ['1']},
+            {'agency_ids': list(range(MAX_BATCH_AGENCIES + 1))},
+            {'filter': {}},
+            {'filter': {'pending': True}},
+        ):
+            with self.subTest(payload=payload):
+                response, queries, _ = self.post('/api/admin/approve_agencies/', payload)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse([sql for sql in queries if sql.startswith('UPDATE')])
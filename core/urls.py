@@ -25,6 +25,10 @@ router.register(r'agency/manage', views.AgencyManagementViewSet, basename='agenc
 router.register(r'admin', views.AdminViewSet, basename='admin')
 
 urlpatterns = [
+    # Async social logins, ahead of the router so they stay under auth/
+    path('auth/google_login/', views.google_login, name='auth-google-login'),
+    path('auth/facebook_login/', views.facebook_login, name='auth-facebook-login'),
+
     # ViewSet routes (this will create the endpoints you're using)
     path('', include(router.urls)),
     
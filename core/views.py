@@ -3,28 +3,233 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import login
-from django.db.models import Q, Avg
+from django.conf import settings
+from django.db import transaction
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.paginator import InvalidPage
+from django.db.models import Avg, Count, Max, prefetch_related_objects
+from django.db.models.functions import Greatest
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from datetime import datetime, date
+import hashlib
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-import requests
+from rest_framework.renderers import JSONRenderer
+import json
 
 
 from .models import (
     User, Tourist, Guide, Agency, Package, Booking, Rating
 )
 
+from .cache import HOMEPAGE_CACHE, get_or_rebuild
+from .dynamic_fields import load_only_serialized, requested_field_spec
+from .fast_serializers import get_values_serializer
+from .oauth_clients import ProviderError, fetch_facebook_profile, fetch_google_profile
+from .oauth_utils import SocialAuthUtils
+from .revocation import revoke_token
+from .filters import AgencyFilterSet, BookingFilterSet, GuideFilterSet, PackageSearchFilter
+from .pagination import RatingKeysetPagination
+from .approvals import MAX_BATCH_AGENCIES, BatchTooLarge, decide_agencies
+from .availability import MAX_BATCH_GUIDES, guide_availability, parse_window, reserve_guide_dates
 from .serializers import (
      CustomTokenObtainPairSerializer, UserRegistrationSerializer,UserLoginSerializer, UserSerializer,
     TouristSerializer, GuideSerializer, GuideListSerializer, AgencySerializer, AgencyListSerializer,
-    PackageSerializer, PackageListSerializer, BookingSerializer, BookingCreateSerializer,
+    PackageSerializer, PackageListSerializer, PackageSearchSerializer, BookingSerializer, BookingCreateSerializer,
     RatingSerializer, RatingCreateSerializer, GoogleOAuthSerializer, FacebookOAuthSerializer,
 )
 
+# Relations walked by each serializer tree, loaded up front to avoid N+1 queries
+USER_RELATED = ('user',)
+PACKAGE_LIST_RELATED = ('agency__user',)
+AGENCY_DETAIL_RELATED = ('user',)
+AGENCY_DETAIL_PREFETCH = ('managed_guides__user',)
+BOOKING_RELATED = ('tourist__user', 'package__agency__user', 'guide__user', 'agency__user')
+RATING_RELATED = BOOKING_RELATED
+
+# Rows fetched per server-side cursor round trip when streaming exports
+STREAM_CHUNK_SIZE = 500
+
+
+class EagerLoadingMixin:
+    """
+    Load the relations a viewset's serializers need together with its queryset.
+    Requests narrowing the response with ?fields= or ?expand= load only the
+    columns and relations of the narrowed serializer instead.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def get_queryset(self):
+        return self.eager_load(super().get_queryset())
+
+    def eager_load(self, queryset):
+        if requested_field_spec(self.request) is not None:
+            return load_only_serialized(queryset, self.get_serializer())
+        return eager_load(queryset, self.select_related_fields, self.prefetch_related_fields)
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional list and retrieve requests (If-None-Match /
+    If-Modified-Since) with 304 before anything is serialized. Detail
+    validators come from one aggregate query: the latest ``updated_at`` of the
+    row and the relations its serializer nests (``detail_last_modified_fields``)
+    plus the counts of ``detail_count_fields``, to-many relations the body
+    lists whose membership changes do not touch any ``updated_at``. Paginated
+    list validators cover only the requested page's rows (their ids and
+    latest ``last_modified_fields``) and the paginator's count, so deleted
+    rows change the ETag too. Validators are always read before the body, so
+    a write landing in between can only make the ETag older than the body,
+    never newer; the list's paginator reuses their count. Keyset (cursor) list pages are always served.
+    """
+    last_modified_fields = ('updated_at',)
+    detail_last_modified_fields = None
+    detail_count_fields = ()
+
+    def list(self, request, *args, **kwargs):
+        # Keyset pages keep a constant cost; the validators would scan the whole filtered set
+        if getattr(self.paginator, 'cursor_query_param', None) in request.query_params:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(
+            {}, self.last_modified_fields, (), super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return self.conditional_response(
+            {self.lookup_field: self.kwargs[lookup_url_kwarg]},
+            self.detail_last_modified_fields or self.last_modified_fields, self.detail_count_fields,
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def conditional_response(self, lookup, modified_fields, count_fields, handler, request, *args, **kwargs):
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(**lookup)
+            page = self.requested_page(queryset) if not lookup and self.paginator is not None else None
+            if page is not None:
+                validators = self.get_page_validators(queryset, modified_fields, page)
+            else:
+                validators = self.get_validators(queryset, modified_fields, count_fields)
+        except (TypeError, ValueError, DjangoValidationError, InvalidPage):
+            # Malformed lookups and pages are reported by the handler like any other request
+            return handler(request, *args, **kwargs)
+        response = get_conditional_response(request, etag=validators[0], last_modified=validators[1])
+        if response is not None:
+            return response
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = validators[0]
+            if validators[1] is not None:
+                response['Last-Modified'] = http_date(validators[1])
+        return response
+
+    def requested_page(self, queryset):
+        """The page a page-number list request serves, without reading its rows"""
+        pagination = self.paginator
+        page_size = pagination.get_page_size(self.request)
+        if not page_size:
+            return None
+        paginator = pagination.django_paginator_class(queryset, page_size)
+        number = self.request.query_params.get(pagination.page_query_param) or 1
+        if number in pagination.last_page_strings:
+            number = paginator.num_pages
+        page = paginator.page(number)
+        if hasattr(pagination, 'known_count'):
+            pagination.known_count = paginator.count
+        return page
+
+    def get_page_validators(self, queryset, modified_fields, page):
+        offset = (page.number - 1) * page.paginator.per_page
+        rows = queryset.values('pk')[offset:offset + page.paginator.per_page]
+        latest = [Max(field) for field in modified_fields]
+        values = queryset.model._default_manager.filter(pk__in=rows).aggregate(
+            last_modified=Greatest(*latest) if len(latest) > 1 else latest[0],
+            ids=ArrayAgg('pk', order_by='pk', default=[]),
+        )
+        return self.make_validators([values['last_modified'], values['ids'], page.paginator.count],
+                                    values['last_modified'])
+
+    def get_validators(self, queryset, modified_fields, count_fields):
+        latest = [Max(field) for field in modified_fields]
+        aggregates = {
+            'last_modified': Greatest(*latest) if len(latest) > 1 else latest[0],
+            'rows': Count('pk', distinct=bool(count_fields)),
+        }
+        for field in count_fields:
+            aggregates[f'{field}_count'] = Count(field, distinct=True)
+        values = queryset.order_by().aggregate(**aggregates)
+        return self.make_validators(values.values(), values['last_modified'])
+
+    def make_validators(self, values, last_modified):
+        """(ETag, Last-Modified timestamp) of a response built from rows described by ``values``"""
+        # The body also depends on the page, filters and renderer, not only on the rows
+        key = [str(value) for value in values]
+        key += [self.request.get_full_path(), self.request.accepted_renderer.format]
+        etag = quote_etag(hashlib.md5(':'.join(key).encode(), usedforsecurity=False).hexdigest())
+        return etag, int(last_modified.timestamp()) if last_modified else None
+
+
+class ValuesListMixin:
+    """
+    Serve list responses from values() rows through the compiled form of the
+    list serializer, skipping model instantiation and per-row field binding.
+    Serializers the fast path cannot compile, and requests narrowed with
+    ?fields= or ?expand=, use the regular list().
+    """
+
+    def list(self, request, *args, **kwargs):
+        fast = None
+        if requested_field_spec(request) is None:
+            fast = get_values_serializer(self.get_serializer_class())
+        if fast is None:
+            return super().list(request, *args, **kwargs)
+        queryset = fast.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fast.to_representation(page, request))
+        return Response(fast.to_representation(queryset, request))
+
+
+def eager_load(queryset, select_related=(), prefetch_related=()):
+    """Apply select_related/prefetch_related to a queryset"""
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+def stream_json_array(queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield a queryset as a JSON array, reading it through a server-side cursor
+    and rendering one chunk of rows at a time so memory stays flat.
+    """
+    renderer = JSONRenderer()
+    yield b'['
+    rows = []
+    separator = b''
+    for instance in queryset.iterator(chunk_size=chunk_size):
+        rows.append(renderer.render(serializer_class(instance).data))
+        if len(rows) == chunk_size:
+            yield separator + b','.join(rows)
+            rows, separator = [], b','
+    if rows:
+        yield separator + b','.join(rows)
+    yield b']'
+
+
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
@@ -70,15 +275,10 @@ class AuthViewSet(viewsets.GenericViewSet):
         if serializer.is_valid():
             user = serializer.save()
             
-            # Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            # Generate JWT tokens, carrying the claims ClaimsJWTAuthentication reads
+            refresh = CustomTokenObtainPairSerializer.get_token(user)
             access = refresh.access_token
             
-            # Add custom claims
-            access['user_type'] = user.user_type
-            access['username'] = user.username
-            access['email'] = user.email
-            
             return Response({
                 'user': UserSerializer(user).data,
                 'access': str(access),
@@ -95,15 +295,10 @@ class AuthViewSet(viewsets.GenericViewSet):
             user = serializer.validated_data['user']
             login(request, user)
             
-            # Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            # Generate JWT tokens, carrying the claims ClaimsJWTAuthentication reads
+            refresh = CustomTokenObtainPairSerializer.get_token(user)
             access = refresh.access_token
             
-            # Add custom claims
-            access['user_type'] = user.user_type
-            access['username'] = user.username
-            access['email'] = user.email
-            
             return Response({
                 'user': UserSerializer(user).data,
                 'access': str(access),
@@ -114,16 +309,15 @@ class AuthViewSet(viewsets.GenericViewSet):
     
     @action(detail=False, methods=['post'])
     def logout(self, request):
+        refresh_token = request.data.get('refresh')
+        if not refresh_token:
+            return Response({'error': 'Refresh token required'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            refresh_token = request.data.get('refresh')
-            if refresh_token:
-                token = RefreshToken(refresh_token)
-                token.blacklist()
-                return Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
-            else:
-                return Response({'error': 'Refresh token required'}, status=status.HTTP_400_BAD_REQUEST)
-        except Exception as e:
+            token = RefreshToken(refresh_token)
+        except TokenError:
             return Response({'error': 'Invalid token'}, status=status.HTTP_400_BAD_REQUEST)
+        revoke_token(token)
+        return Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
     
     
     @action(detail=False, methods=['get'])
@@ -148,7 +342,9 @@ class AuthViewSet(viewsets.GenericViewSet):
                 pass
         elif request.user.user_type == 'agency':
             try:
-                profile = AgencySerializer(request.user.agency_profile).data
+                agency_profile = request.user.agency_profile
+                prefetch_related_objects([agency_profile], *AGENCY_DETAIL_PREFETCH)
+                profile = AgencySerializer(agency_profile).data
                 user_data['profile'] = profile
             except:
                 pass
@@ -156,116 +352,82 @@ class AuthViewSet(viewsets.GenericViewSet):
         return Response(user_data, status=status.HTTP_200_OK)
     
     from rest_framework.decorators import action
- 
-    
-    @action(detail=False, methods=['post'])
-    def google_login(self, request):
-        """Google OAuth Login/Register"""
-        access_token = request.data.get("access_token")
-
-        if not access_token:
-            return Response({"error": "Access token is required"}, status=400)
-
-        # Validate access token using Google's UserInfo endpoint
-        google_user_info_url = "https://www.googleapis.com/oauth2/v1/userinfo"
-        response = requests.get(
-            google_user_info_url,
-            params={'alt': 'json'},
-            headers={'Authorization': f'Bearer {access_token}'}
-        )
-
-        if response.status_code != 200:
-            return Response({"error": "Invalid Google token"}, status=400)
-
-        user_info = response.json()
-        email = user_info.get("email")
-        name = user_info.get("name", "")
-        picture = user_info.get("picture")
-
-        if not email:
-            return Response({"error": "Email not found in Google profile"}, status=400)
-
-        # Get or create the user
-        user, created = User.objects.get_or_create(email=email, defaults={
-            'username': email.split('@')[0],
-            'first_name': name.split()[0] if name else '',
-            'last_name': name.split()[-1] if len(name.split()) > 1 else '',
-            'is_verified': True,
-            'is_approved': True,
-        })
 
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
-        access = refresh.access_token
 
-        # Optional: Add custom claims
-        access['user_type'] = user.user_type
-        access['username'] = user.username
-        access['email'] = user.email
+def _social_login_response(user_data, provider):
+    """Log in or register the user with a provider's verified profile"""
+    user, created = SocialAuthUtils.get_or_create_user_from_social_data(user_data, provider)
 
-        message = 'Registration successful' if created else 'Login successful'
-
-        return Response({
-            'user': UserSerializer(user).data,
-            'access': str(access),
-            'refresh': str(refresh),
-            'message': message,
-            'created': created
-        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
-
-    
-    @action(detail=False, methods=['post'])
-    def facebook_login(self, request):
-        """Facebook OAuth Login/Register"""
-        access_token = request.data.get('access_token')
-
-        if not access_token:
-            return Response({'error': 'Access token is required'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Step 1: Validate access token and get user info from Facebook
-        fb_response = requests.get(
-            'https://graph.facebook.com/me',
-            params={
-                'fields': 'id,name,email',
-                'access_token': access_token
-            }
-        )
+    # Generate JWT tokens, carrying the claims ClaimsJWTAuthentication reads
+    refresh = CustomTokenObtainPairSerializer.get_token(user)
+    return JsonResponse({
+        'user': UserSerializer(user).data,
+        'access': str(refresh.access_token),
+        'refresh': str(refresh),
+        'message': 'Registration successful' if created else 'Login successful',
+        'created': created
+    }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
-        if fb_response.status_code != 200:
-            return Response({'error': 'Invalid Facebook token'}, status=status.HTTP_400_BAD_REQUEST)
 
-        fb_data = fb_response.json()
-        email = fb_data.get('email')
-        name = fb_data.get('name')
-
-        if not email:
-            return Response({'error': 'Email permission is required'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Step 2: Get or create user
-        user, created = User.objects.get_or_create(email=email, defaults={
-            'username': email.split('@')[0],
-            'full_name': name,  # optional: adjust according to your user model
-            'is_active': True,
-        })
-
-        # Step 3: Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
-        access = refresh.access_token
-
-        # Optional: add custom claims
-        access['user_type'] = getattr(user, 'user_type', '')
-        access['username'] = user.username
-        access['email'] = user.email
-
-        message = 'Registration successful' if created else 'Login successful'
-
-        return Response({
-            'user': UserSerializer(user).data,
-            'access': str(access),
-            'refresh': str(refresh),
-            'message': message,
-            'created': created
-        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+def _request_access_token(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}').get('access_token')
+        except (ValueError, AttributeError):
+            return None
+    return request.POST.get('access_token')
+
+
+@csrf_exempt
+@require_POST
+async def google_login(request):
+    """Google OAuth Login/Register"""
+    access_token = _request_access_token(request)
+    if not access_token:
+        return JsonResponse({'error': 'Access token is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Validate access token using Google's UserInfo endpoint
+    try:
+        user_info = await fetch_google_profile(access_token)
+    except ProviderError as e:
+        return JsonResponse({'error': e.message}, status=e.status)
+
+    if not user_info.get('email') or not user_info.get('id'):
+        return JsonResponse({'error': 'Email not found in Google profile'}, status=status.HTTP_400_BAD_REQUEST)
+    return await sync_to_async(_social_login_response)({
+        'google_id': user_info['id'],
+        'email': user_info['email'],
+        'first_name': user_info.get('given_name', ''),
+        'last_name': user_info.get('family_name', ''),
+        'name': user_info.get('name', ''),
+        'profile_image': user_info.get('picture', ''),
+    }, 'google')
+
+
+@csrf_exempt
+@require_POST
+async def facebook_login(request):
+    """Facebook OAuth Login/Register"""
+    access_token = _request_access_token(request)
+    if not access_token:
+        return JsonResponse({'error': 'Access token is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Validate access token and get user info from Facebook
+    try:
+        fb_data = await fetch_facebook_profile(access_token)
+    except ProviderError as e:
+        return JsonResponse({'error': e.message}, status=e.status)
+
+    if not fb_data.get('email') or not fb_data.get('id'):
+        return JsonResponse({'error': 'Email permission is required'}, status=status.HTTP_400_BAD_REQUEST)
+    return await sync_to_async(_social_login_response)({
+        'facebook_id': fb_data['id'],
+        'email': fb_data['email'],
+        'first_name': fb_data.get('first_name', ''),
+        'last_name': fb_data.get('last_name', ''),
+        'name': fb_data.get('name', ''),
+        'profile_image': fb_data.get('picture', {}).get('data', {}).get('url', ''),
+    }, 'facebook')
 
 
 # User Profile Views
@@ -319,6 +481,7 @@ class ProfileViewSet(viewsets.GenericViewSet):
         agency_profile, created = Agency.objects.get_or_create(user=request.user)
         
         if request.method == 'GET':
+            prefetch_related_objects([agency_profile], *AGENCY_DETAIL_PREFETCH)
             serializer = AgencySerializer(agency_profile)
             return Response(serializer.data)
         
@@ -329,32 +492,21 @@ class ProfileViewSet(viewsets.GenericViewSet):
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-# Guide Discovery Views
-class GuideViewSet(viewsets.ReadOnlyModelViewSet):
-    """Public guide listing and search"""
-    queryset = Guide.objects.filter(user__is_approved=True, user__is_active=True)
-    serializer_class = GuideListSerializer
-    permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['languages', 'specializations', 'user__is_verified']
-    search_fields = ['user__first_name', 'user__last_name', 'specializations', 'bio']
-    ordering_fields = ['average_rating', 'hourly_rate', 'daily_rate', 'experience_years']
-    ordering = ['-average_rating']
-    
-    @action(detail=True, methods=['get'])
-    def availability(self, request, pk=None):
-        """Check guide availability"""
-        guide = self.get_object()
-        # TODO: Implement availability logic with bookings
-        return Response({'message': 'Availability checking not implemented yet'})
-
 # Agency Views
-class AgencyViewSet(viewsets.ReadOnlyModelViewSet):
+class AgencyViewSet(ConditionalGetMixin, ValuesListMixin, EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     """Public agency listing and search"""
     queryset = Agency.objects.filter(user__is_approved=True, user__is_active=True)
     serializer_class = AgencyListSerializer
+    select_related_fields = USER_RELATED
+    last_modified_fields = ('updated_at', 'user__updated_at')
+    detail_last_modified_fields = last_modified_fields + (
+        'managed_guides__updated_at', 'managed_guides__user__updated_at',
+    )
+    detail_count_fields = ('managed_guides',)
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filterset_class = AgencyFilterSet
+    pagination_class = RatingKeysetPagination
     search_fields = ['company_name', 'description', 'address']
     ordering_fields = ['average_rating', 'total_bookings', 'user__created_at']
     ordering = ['-average_rating']
@@ -363,7 +515,9 @@ class AgencyViewSet(viewsets.ReadOnlyModelViewSet):
     def guides(self, request, pk=None):
         """Get guides managed by this agency"""
         agency = self.get_object()
-        guides = agency.managed_guides.filter(user__is_approved=True, user__is_active=True)
+        guides = agency.managed_guides.filter(
+            user__is_approved=True, user__is_active=True
+        ).select_related(*USER_RELATED)
         serializer = GuideListSerializer(guides, many=True)
         return Response(serializer.data)
     
@@ -371,7 +525,7 @@ class AgencyViewSet(viewsets.ReadOnlyModelViewSet):
     def packages(self, request, pk=None):
         """Get packages offered by this agency"""
         agency = self.get_object()
-        packages = agency.packages.filter(is_active=True)
+        packages = agency.packages.filter(is_active=True).select_related(*PACKAGE_LIST_RELATED)
         serializer = PackageListSerializer(packages, many=True)
         return Response(serializer.data)
     
@@ -379,22 +533,30 @@ class AgencyViewSet(viewsets.ReadOnlyModelViewSet):
     def ratings(self, request, pk=None):
         """Get ratings for this agency"""
         agency = self.get_object()
-        ratings = agency.ratings.all().order_by('-created_at')
+        ratings = agency.ratings.select_related(*RATING_RELATED).order_by('-created_at')
         serializer = RatingSerializer(ratings, many=True)
         return Response(serializer.data)
 
 # Package Views
-class PackageViewSet(viewsets.ReadOnlyModelViewSet):
+class PackageViewSet(ConditionalGetMixin, ValuesListMixin, EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     """Public package listing and search"""
     queryset = Package.objects.filter(is_active=True, agency__user__is_approved=True)
     serializer_class = PackageListSerializer
+    select_related_fields = PACKAGE_LIST_RELATED
+    last_modified_fields = ('updated_at', 'agency__updated_at', 'agency__user__updated_at')
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    # Search runs last so its relevance ordering replaces the default ordering
+    filter_backends = [DjangoFilterBackend, OrderingFilter, PackageSearchFilter]
     filterset_fields = ['package_type', 'duration_days']
-    search_fields = ['name', 'description', 'destinations']
+    pagination_class = RatingKeysetPagination
     ordering_fields = ['price', 'average_rating', 'total_bookings', 'created_at']
     ordering = ['-average_rating']
     
+    def get_serializer_class(self):
+        if self.action == 'list' and PackageSearchFilter().get_search_terms(self.request):
+            return PackageSearchSerializer
+        return super().get_serializer_class()
+    
     @action(detail=True, methods=['get'])
     def agencies(self, request, pk=None):
         """Get agencies offering similar packages"""
@@ -407,7 +569,7 @@ class PackageViewSet(viewsets.ReadOnlyModelViewSet):
         
         agencies = Agency.objects.filter(
             packages__in=similar_packages
-        ).distinct()
+        ).distinct().select_related(*USER_RELATED)
         
         serializer = AgencyListSerializer(agencies, many=True)
         return Response(serializer.data)
@@ -416,18 +578,21 @@ class PackageViewSet(viewsets.ReadOnlyModelViewSet):
     def ratings(self, request, pk=None):
         """Get ratings for this package"""
         package = self.get_object()
-        ratings = package.ratings.all().order_by('-created_at')
+        ratings = package.ratings.select_related(*RATING_RELATED).order_by('-created_at')
         serializer = RatingSerializer(ratings, many=True)
         return Response(serializer.data)
 
-# Enhanced Guide Views
-class GuideViewSet(viewsets.ReadOnlyModelViewSet):
+# Guide Views
+class GuideViewSet(ConditionalGetMixin, ValuesListMixin, EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     """Public guide listing and search"""
     queryset = Guide.objects.filter(user__is_approved=True, user__is_active=True)
     serializer_class = GuideListSerializer
+    select_related_fields = USER_RELATED
+    last_modified_fields = ('updated_at', 'user__updated_at')
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['languages', 'specializations', 'user__is_verified']
+    filterset_class = GuideFilterSet
+    pagination_class = RatingKeysetPagination
     search_fields = ['user__first_name', 'user__last_name', 'specializations', 'bio']
     ordering_fields = ['average_rating', 'hourly_rate', 'daily_rate', 'experience_years']
     ordering = ['-average_rating']
@@ -436,7 +601,9 @@ class GuideViewSet(viewsets.ReadOnlyModelViewSet):
     def agencies(self, request, pk=None):
         """Get agencies this guide is registered with"""
         guide = self.get_object()
-        agencies = Agency.objects.filter(managed_guides=guide, user__is_approved=True)
+        agencies = Agency.objects.filter(
+            managed_guides=guide, user__is_approved=True
+        ).select_related(*USER_RELATED)
         serializer = AgencyListSerializer(agencies, many=True)
         return Response(serializer.data)
     
@@ -444,28 +611,54 @@ class GuideViewSet(viewsets.ReadOnlyModelViewSet):
     def ratings(self, request, pk=None):
         """Get ratings for this guide"""
         guide = self.get_object()
-        ratings = guide.ratings.all().order_by('-created_at')
+        ratings = guide.ratings.select_related(*RATING_RELATED).order_by('-created_at')
         serializer = RatingSerializer(ratings, many=True)
         return Response(serializer.data)
     
     @action(detail=True, methods=['get'])
     def availability(self, request, pk=None):
-        """Check guide availability"""
+        """Free and booked days of a guide between start_date and end_date"""
         guide = self.get_object()
-        # TODO: Implement availability logic with bookings
-        return Response({'message': 'Availability checking not implemented yet'})
+        start, end = parse_window(request.query_params)
+        calendar = guide_availability([guide.id], start, end)[guide.id]
+        return Response({'guide_id': guide.id, **calendar})
+    
+    @action(detail=False, methods=['get'])
+    def batch_availability(self, request):
+        """Availability of several guides (?ids=1,2,3) in a single request"""
+        start, end = parse_window(request.query_params)
+        try:
+            requested = [int(value) for value in request.query_params.get('ids', '').split(',') if value]
+        except ValueError:
+            return Response({'error': 'ids must be a comma separated list of guide ids'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not requested:
+            return Response({'error': 'ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(requested) > MAX_BATCH_GUIDES:
+            return Response({'error': f'At most {MAX_BATCH_GUIDES} guides per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        guide_ids = list(self.get_queryset().filter(id__in=requested).values_list('id', flat=True))
+        calendars = guide_availability(guide_ids, start, end)
+        return Response({
+            'start_date': start,
+            'end_date': end,
+            'guides': [{'guide_id': guide_id, **calendars[guide_id]} for guide_id in requested
+                       if guide_id in calendars],
+        })
 
 # Tourist Booking and Rating Views
-class TouristBookingViewSet(viewsets.ModelViewSet):
+class TouristBookingViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     """Tourist booking management"""
     serializer_class = BookingSerializer
+    select_related_fields = BOOKING_RELATED
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
         if self.request.user.user_type == 'tourist':
             try:
                 tourist = self.request.user.tourist_profile
-                return tourist.bookings.all().order_by('-created_at')
+                return self.eager_load(tourist.bookings.order_by('-created_at'))
             except:
                 return Booking.objects.none()
         return Booking.objects.none()
@@ -475,6 +668,7 @@ class TouristBookingViewSet(viewsets.ModelViewSet):
             return BookingCreateSerializer
         return BookingSerializer
     
+    @transaction.atomic
     def perform_create(self, serializer):
         # Ensure tourist profile exists
         tourist_profile, created = Tourist.objects.get_or_create(user=self.request.user)
@@ -489,6 +683,8 @@ class TouristBookingViewSet(viewsets.ModelViewSet):
             # Calculate based on guide's daily rate and duration
             start_date = booking_data['start_date']
             end_date = booking_data['end_date']
+            # Held until commit, so overlapping requests for this guide wait for each other
+            reserve_guide_dates(booking_data['guide'].id, start_date, end_date)
             duration = (end_date - start_date).days + 1
             total_price = booking_data['guide'].daily_rate * duration * number_of_people
         else:
@@ -497,16 +693,17 @@ class TouristBookingViewSet(viewsets.ModelViewSet):
         
         serializer.save(tourist=tourist_profile, total_price=total_price)
 
-class TouristRatingViewSet(viewsets.ModelViewSet):
+class TouristRatingViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     """Tourist rating management"""
     serializer_class = RatingSerializer
+    select_related_fields = RATING_RELATED
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
         if self.request.user.user_type == 'tourist':
             try:
                 tourist = self.request.user.tourist_profile
-                return tourist.ratings.all().order_by('-created_at')
+                return self.eager_load(tourist.ratings.order_by('-created_at'))
             except:
                 return Rating.objects.none()
         return Rating.objects.none()
@@ -516,10 +713,21 @@ class TouristRatingViewSet(viewsets.ModelViewSet):
             return RatingCreateSerializer
         return RatingSerializer
     
+    # Saving or deleting a rating also updates the target's aggregates,
+    # so both writes share one transaction
+    @transaction.atomic
     def perform_create(self, serializer):
         # Ensure tourist profile exists
         tourist_profile, created = Tourist.objects.get_or_create(user=self.request.user)
         serializer.save(tourist=tourist_profile)
+    
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+    
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
 
 # Agency Management Views
 class AgencyManagementViewSet(viewsets.GenericViewSet):
@@ -542,7 +750,7 @@ class AgencyManagementViewSet(viewsets.GenericViewSet):
             return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
         
         if request.method == 'GET':
-            packages = agency.packages.all()
+            packages = agency.packages.select_related(*PACKAGE_LIST_RELATED)
             serializer = PackageSerializer(packages, many=True)
             return Response(serializer.data)
         
@@ -561,7 +769,7 @@ class AgencyManagementViewSet(viewsets.GenericViewSet):
             return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
         
         if request.method == 'GET':
-            guides = agency.managed_guides.all()
+            guides = agency.managed_guides.select_related(*USER_RELATED)
             serializer = GuideSerializer(guides, many=True)
             return Response(serializer.data)
         
@@ -576,35 +784,54 @@ class AgencyManagementViewSet(viewsets.GenericViewSet):
     
     @action(detail=False, methods=['get'])
     def bookings(self, request):
-        """View agency bookings"""
+        """
+        View agency bookings, paginated and filtered with BookingFilterSet.
+        ?stream=true returns every matching booking as a streamed JSON array.
+        """
         agency = self.get_agency_profile()
         if not agency:
             return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        # Get all bookings for this agency's packages, guides, or direct agency bookings
+        # Bookings for this agency's packages, guides, or direct agency bookings,
+        # read newest first from the denormalized ownership links
         bookings = Booking.objects.filter(
-            Q(package__agency=agency) | 
-            Q(guide__in=agency.managed_guides.all()) |
-            Q(agency=agency)
-        ).order_by('-created_at')
+            agency_links__agency=agency
+        ).select_related(*BOOKING_RELATED).order_by('-agency_links__created_at', '-agency_links__booking')
         
-        serializer = BookingSerializer(bookings, many=True)
-        return Response(serializer.data)
+        filterset = BookingFilterSet(request.query_params, queryset=bookings, request=request)
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        bookings = filterset.qs
+        
+        if request.query_params.get('stream', '').lower() in ('1', 'true'):
+            return StreamingHttpResponse(
+                stream_json_array(bookings, BookingSerializer), content_type='application/json'
+            )
+        
+        page = self.paginate_queryset(bookings)
+        serializer = BookingSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 # Admin Views
+class IsAdminUserType(permissions.BasePermission):
+    """Allow access only to users of type admin"""
+    message = 'Admin access required'
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and request.user.user_type == 'admin')
+
+
 class AdminViewSet(viewsets.GenericViewSet):
     """Admin management views"""
-    permission_classes = [IsAuthenticated]
-    
-    def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_authenticated or request.user.user_type != 'admin':
-            return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
-        return super().dispatch(request, *args, **kwargs)
+    permission_classes = [IsAuthenticated, IsAdminUserType]
     
     @action(detail=False, methods=['get'])
     def pending_agencies(self, request):
         """Get agencies pending approval"""
-        agencies = Agency.objects.filter(user__is_approved=False)
+        agencies = eager_load(
+            Agency.objects.filter(user__is_approved=False),
+            AGENCY_DETAIL_RELATED, AGENCY_DETAIL_PREFETCH
+        )
         serializer = AgencySerializer(agencies, many=True)
         return Response(serializer.data)
     
@@ -632,6 +859,59 @@ class AdminViewSet(viewsets.GenericViewSet):
             return Response({'message': 'Agency rejected'})
         except Agency.DoesNotExist:
             return Response({'error': 'Agency not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    @action(detail=False, methods=['post'])
+    def approve_agencies(self, request):
+        """Approve the agencies given as agency_ids, or matching filter, in one update"""
+        return self.decide_batch(request, 'approve')
+    
+    @action(detail=False, methods=['post'])
+    def reject_agencies(self, request):
+        """Reject the agencies given as agency_ids, or matching filter, in one update"""
+        return self.decide_batch(request, 'reject')
+    
+    def decide_batch(self, request, decision):
+        """Apply a decision to a batch of agencies and report the outcome of each"""
+        agency_ids, filters = request.data.get('agency_ids'), request.data.get('filter')
+        if (agency_ids is None) == (filters is None):
+            return Response({'error': 'Provide either agency_ids or filter'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        if agency_ids is not None:
+            if (not isinstance(agency_ids, list) or not agency_ids
+                    or not all(isinstance(value, int) and not isinstance(value, bool) for value in agency_ids)):
+                return Response({'error': 'agency_ids must be a non-empty list of agency ids'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if len(agency_ids) > MAX_BATCH_AGENCIES:
+                return Response({'error': f'At most {MAX_BATCH_AGENCIES} agencies per request'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            agencies = Agency.objects.filter(id__in=agency_ids)
+        else:
+            if not isinstance(filters, dict) or not filters:
+                return Response({'error': 'filter must be a non-empty object of agency filters'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            unknown = sorted(set(filters) - set(AgencyFilterSet.base_filters))
+            if unknown:
+                # A filter the set ignores would otherwise widen the batch to every agency
+                return Response({'error': f'Unknown filters: {", ".join(unknown)}'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            filterset = AgencyFilterSet(data=filters, queryset=Agency.objects.all(), request=request)
+            if not filterset.is_valid():
+                return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+            agencies = filterset.qs
+        
+        try:
+            outcomes = decide_agencies(agencies, decision)
+        except BatchTooLarge as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        requested = dict.fromkeys(agency_ids) if agency_ids is not None else outcomes
+        results = [{'agency_id': agency_id, 'outcome': outcomes.get(agency_id, 'not_found')}
+                   for agency_id in requested]
+        summary = {}
+        for result in results:
+            summary[result['outcome']] = summary.get(result['outcome'], 0) + 1
+        return Response({'results': results, 'summary': summary})
 
 # Homepage Views
 class HomepageViewSet(viewsets.GenericViewSet):
@@ -641,26 +921,33 @@ class HomepageViewSet(viewsets.GenericViewSet):
     @action(detail=False, methods=['get'])
     def content(self, request):
         """Get homepage content - packages, guides, and agencies"""
+        # Served from cache; core.signals invalidates it when listed content changes
+        payload = get_or_rebuild(
+            HOMEPAGE_CACHE, self.build_content, fresh_for=settings.HOMEPAGE_CACHE_TIMEOUT
+        )
+        return Response(payload)
+    
+    def build_content(self):
         # Featured packages
         featured_packages = Package.objects.filter(
             is_active=True, 
             agency__user__is_approved=True
-        ).order_by('-average_rating')[:6]
+        ).select_related(*PACKAGE_LIST_RELATED).order_by('-average_rating')[:6]
         
         # Top guides
         top_guides = Guide.objects.filter(
             user__is_approved=True, 
             user__is_active=True
-        ).order_by('-average_rating')[:6]
+        ).select_related(*USER_RELATED).order_by('-average_rating')[:6]
         
         # Top agencies
         top_agencies = Agency.objects.filter(
             user__is_approved=True, 
             user__is_active=True
-        ).order_by('-average_rating')[:6]
+        ).select_related(*USER_RELATED).order_by('-average_rating')[:6]
         
-        return Response({
+        return {
             'packages': PackageListSerializer(featured_packages, many=True).data,
             'guides': GuideListSerializer(top_guides, many=True).data,
             'agencies': AgencyListSerializer(top_agencies, many=True).data,
-        })
+        }